@@ -0,0 +1,187 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.graph_objs as go
+
+import main
+
+#-----------------------------------------------------------------
+# ---------------BENCHMARK DO PIPELINE DO MAPA---------------------
+#-----------------------------------------------------------------
+# Gera listagens sintéticas no formato do Inside Airbnb (mesmos nomes de
+# coluna, preço em texto "$1,234.00", valores ausentes) e mede cada etapa:
+# tempo de relógio, pico de memória alocada (tracemalloc) e tamanho do html.
+# O tracemalloc deixa cada etapa mais lenta numa proporção diferente (muito
+# no pandas, pouco no plotly), então cada etapa roda duas vezes: uma com o
+# tracemalloc ligado só para o pico de memória e outra, sem ele, para o
+# tempo. --no-memory pula a primeira (metade do tempo e sem o custo de
+# memória do próprio tracemalloc nos tamanhos grandes).
+# O resultado vai para um json com o commit atual, para comparar versões.
+#
+#   python bench.py --sizes 10k,100k --out bench.json
+
+DEFAULT_SIZES = '10k,100k,1M,10M'
+NEIGHBOURHOODS = ['Manhattan', 'Brooklyn', 'Queens', 'Bronx', 'Staten Island']
+ROOM_TYPES = ['Entire home/apt', 'Private room', 'Shared room', 'Hotel room']
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    mult = {'k': 1_000, 'm': 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * mult)
+
+
+def make_listings(n: int, seed: int = 0, missing: float = 0.02) -> pd.DataFrame:
+    """
+    Listagens sintéticas com ~16 colunas no padrão Inside Airbnb.
+    missing: fração de preços e de coordenadas (latitude) ausentes
+    """
+    rng = np.random.default_rng(seed)
+    price = rng.lognormal(5, 0.9, n)
+    price_txt = pd.Series(price).map('${:,.2f}'.format)
+    price_txt[rng.random(n) < missing] = np.nan
+    lat = 40.72 + rng.normal(0, 0.06, n)
+    lat[rng.random(n) < missing / 2] = np.nan
+    ids = np.arange(1, n + 1)
+    return pd.DataFrame({
+        'id': ids,
+        'name': pd.Series(ids).map('Cozy place #{}'.format),
+        'host_id': rng.integers(1, max(n // 3, 2), n),
+        'host_name': rng.choice(['Ana', 'John', 'Maria', 'Wei', 'Fatima'], n),
+        'neighbourhood_group': rng.choice(NEIGHBOURHOODS, n),
+        'neighbourhood': rng.choice(['Harlem', 'Williamsburg', 'Astoria', 'SoHo'], n),
+        'latitude': lat,
+        'longitude': -73.95 + rng.normal(0, 0.08, n),
+        'room_type': rng.choice(ROOM_TYPES, n),
+        'price': price_txt,
+        'minimum_nights': rng.integers(1, 30, n),
+        'number_of_reviews': rng.poisson(20, n),
+        'last_review': '2025-06-01',
+        'reviews_per_month': np.round(rng.gamma(1, 1, n), 2),
+        'calculated_host_listings_count': rng.integers(1, 10, n),
+        'availability_365': rng.integers(0, 366, n),
+    })
+
+
+def write_listings_csv(n: int, folder: str, seed: int = 0) -> str:
+    """CSV sintético com n linhas (reaproveitado se já existir na pasta)"""
+    path = os.path.join(folder, f'listings-{n}-{seed}.csv')
+    if not os.path.exists(path):
+        # gera em blocos para não segurar 10M linhas de texto na memória
+        block = 1_000_000
+        for i, start in enumerate(range(0, n, block)):
+            part = make_listings(min(block, n - start), seed + i)
+            part['id'] += start
+            part.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+    return path
+
+
+def measure(stage: str, rows: int, fn, *args, memory: bool = True, **kw):
+    """
+    Roda fn medindo tempo e pico de memória; devolve (resultado, registro).
+    O pico vem de uma execução com tracemalloc (resultado descartado) e o
+    tempo de outra sem ele. memory=False mede só o tempo (peak_mb = None)
+    """
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            traced = fn(*args, **kw)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        del traced
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    wall = time.perf_counter() - t0
+    rec = dict(rows = rows, stage = stage, wall_s = round(wall, 4),
+               peak_mb = round(peak / 2**20, 2) if peak is not None else None)
+    mem = f"{peak / 2**20:10.1f} MB" if peak is not None else f"{'-':>13}"
+    print(f"{rows:>10,} {stage:<22} {wall:8.3f}s {mem}")
+    return out, rec
+
+
+def run_size(n: int, data_dir: str, memory: bool = True) -> list:
+    path = write_listings_csv(n, data_dir)
+    records = []
+    raw, r = measure('read_csv', n, pd.read_csv, path, memory=memory)
+    records.append(r)
+    df, r = measure('standartize_columns', n, main.standartize_columns, raw, memory=memory)
+    records.append(r)
+    del raw
+    _, r = measure('load_city (streaming)', n, main.load_city, path, memory=memory)
+    records.append(r)
+    center, r = measure('city_center', n, main.city_center, df, memory=memory)
+    records.append(r)
+    point, r = measure('make_point_trace', n, main.make_point_trace, df, 'bench', memory=memory)
+    records.append(r)
+    heat, r = measure('make_density_trace', n, main.make_density_trace, df, 'bench', memory=memory)
+    records.append(r)
+
+    fig = go.Figure([point, heat])
+    fig.update_layout(mapbox_style = "open-street-map", mapbox = dict(center=center, zoom=10))
+    out = os.path.join(data_dir, f'bench-{n}.html')
+    _, r = measure('write_html', n, fig.write_html, out, include_plotlyjs='cdn', full_html=True, memory=memory)
+    r['html_bytes'] = os.path.getsize(out)
+    records.append(r)
+    os.remove(out)
+    return records
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline do mapa AirBnB')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='ex.: 10k,100k,1M,10M')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'airbnb_bench'),
+                        help='onde os CSVs sintéticos são gerados/reaproveitados')
+    parser.add_argument('--out', default=None, help='json de saída (padrão: bench-<commit>.json)')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='mede só o tempo (sem a execução extra com tracemalloc)')
+    return parser.parse_args(argv)
+
+
+def main_bench(argv=None) -> dict:
+    args = parse_args(argv)
+    os.makedirs(args.data_dir, exist_ok=True)
+    commit = git_commit()
+    print(f"{'linhas':>10} {'etapa':<22} {'tempo':>9} {'pico mem':>13}")
+    records = []
+    for size in args.sizes.split(','):
+        records += run_size(parse_size(size), args.data_dir, args.memory)
+
+    report = dict(
+        commit = commit,
+        timestamp = datetime.datetime.now().isoformat(timespec='seconds'),
+        python = platform.python_version(),
+        numpy = np.__version__,
+        pandas = pd.__version__,
+        plotly = plotly.__version__,
+        memory = args.memory,
+        results = records,
+    )
+    out = args.out or f"bench-{commit or 'local'}.json"
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"resultados salvos em: {out}")
+    return report
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,133 @@
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import scale
+
+# aumentar quando a normalização mudar, assim caches antigos são descartados
+CACHE_VERSION = 5
+CACHE_DIR = '.cache'
+
+_COLUMNS = ('lat', 'lon', 'custo')
+
+
+#-----------------------------------------------------------------
+# ---------------IMPRESSÃO DIGITAL DO ARQUIVO---------------------
+#-----------------------------------------------------------------
+
+def content_hash(path, block: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for buf in iter(lambda: f.read(block), b''):
+            h.update(buf)
+    return h.hexdigest()
+
+
+def file_fingerprint(path, with_hash: bool = True) -> dict:
+    """Tamanho, mtime e (opcional) hash do conteúdo do arquivo de origem"""
+    st = os.stat(path)
+    fp = dict(size=st.st_size, mtime_ns=st.st_mtime_ns)
+    if with_hash:
+        fp['hash'] = content_hash(path)
+    return fp
+
+
+def entry_dir(path, cache_dir=None) -> str:
+    """Pasta do cache de um arquivo: <cache_dir>/<nome>-<hash do caminho>"""
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR)
+    key = hashlib.blake2b(path.encode('utf-8'), digest_size=6).hexdigest()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{key}")
+
+
+#-----------------------------------------------------------------
+# ---------------LEITURA / ESCRITA--------------------------------
+#-----------------------------------------------------------------
+
+def read_meta(folder):
+    try:
+        with open(os.path.join(folder, 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(path, meta) -> bool:
+    """
+    Confere se o cache ainda vale para o arquivo. Se tamanho e mtime batem
+    não precisa ler o arquivo; se só o mtime mudou (arquivo copiado/tocado)
+    compara o hash do conteúdo antes de invalidar.
+    """
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return False
+    src = meta['source']
+    st = os.stat(path)
+    if st.st_size != src['size']:
+        return False
+    if st.st_mtime_ns == src['mtime_ns']:
+        return True
+    return content_hash(path) == src['hash']
+
+
+def _save_array(dest, arr):
+    # grava em arquivo temporário e troca: quem está com o .npy antigo
+    # mapeado (store.CityStore) continua lendo o inode antigo sem quebrar
+    tmp = dest + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, arr)
+    os.replace(tmp, dest)
+
+
+def save(path, df: pd.DataFrame, cache_dir=None) -> str:
+    """Grava o DataFrame normalizado em colunas .npy ao lado de um meta.json"""
+    folder = entry_dir(path, cache_dir)
+    os.makedirs(folder, exist_ok=True)
+    meta_path = os.path.join(folder, 'meta.json')
+    # o meta.json é o último arquivo gravado: sem ele a entrada não é válida
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    # índices derivados das colunas antigas (spatial.GridIndex) não valem mais
+    for derived in glob.glob(os.path.join(folder, 'grid_*')):
+        os.remove(derived)
+
+    for col in _COLUMNS:
+        _save_array(os.path.join(folder, f"{col}.npy"), df[col].to_numpy(np.float32))
+    # nomes: um único buffer utf-8 separado por \0 (carrega com um split só)
+    names = '\0'.join(s.replace('\0', '') for s in df['nome'].astype(str))
+    _save_array(os.path.join(folder, 'nome.npy'), np.frombuffer(names.encode('utf-8'), dtype=np.uint8))
+    # faixas de quantil do custo, calculadas uma vez por versão dos dados
+    scale.save(folder, scale.compute_scale(df['custo']))
+
+    # generation muda a cada gravação: identifica esta versão das colunas
+    meta = dict(version=CACHE_VERSION, generation=time.time_ns(), rows=int(len(df)),
+                source=file_fingerprint(path), coord_checks=df.attrs.get('coord_checks'))
+    tmp = meta_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+    return folder
+
+
+def check_entry(path, folder) -> bool:
+    """
+    is_fresh para a entrada em folder; se só o mtime mudou (mesmo conteúdo)
+    atualiza o meta.json para não recalcular o hash na próxima vez
+    """
+    meta = read_meta(folder)
+    if not is_fresh(path, meta):
+        return False
+    mtime_ns = os.stat(path).st_mtime_ns
+    if mtime_ns != meta['source']['mtime_ns']:
+        meta['source']['mtime_ns'] = mtime_ns
+        tmp = os.path.join(folder, 'meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(folder, 'meta.json'))
+    return True
@@ -0,0 +1,74 @@
+import json
+import os
+
+import numpy as np
+
+import lod
+
+#-----------------------------------------------------------------
+# ---------------CADASTRO DE CIDADES-------------------------------
+#-----------------------------------------------------------------
+# Lista de mercados em cities.json: arquivo de origem (relativo à pasta de
+# dados ou absoluto), nome exibido e, opcionalmente, o zoom inicial e o
+# centro esperado [lat, lon] da cidade. Sem zoom, ele é calculado pelo
+# retângulo que contém os anúncios. O centro é usado pelo validate para
+# saber se o arquivo veio com lat/lon trocados; sem ele a verificação só
+# funciona para cidades com |lon| > 72.
+
+REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cities.json')
+# tamanho de tela usado para escolher o zoom que enquadra a cidade
+VIEW_PX = (1200, 700)
+
+
+def load_registry(path: str = REGISTRY_FILE) -> list:
+    """Lê o cadastro e valida os campos de cada cidade"""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    out = []
+    labels = set()
+    for i, e in enumerate(entries):
+        if not isinstance(e, dict) or 'file' not in e:
+            raise ValueError(f'{path}: cidade {i} sem o campo "file"')
+        city = dict(
+            file = e['file'],
+            label = e.get('label') or os.path.splitext(os.path.basename(e['file']))[0],
+            zoom = e.get('zoom'),
+            center = e.get('center'),
+        )
+        c = city['center']
+        if c is not None and not (isinstance(c, list) and len(c) == 2
+                                  and all(isinstance(v, (int, float)) for v in c)
+                                  and abs(c[0]) <= 90 and abs(c[1]) <= 180):
+            raise ValueError(f'{path}: centro inválido em {city["label"]} (esperado [lat, lon]): {c}')
+        if city['label'] in labels:
+            raise ValueError(f'{path}: nome de cidade repetido: {city["label"]}')
+        labels.add(city['label'])
+        out.append(city)
+    return out
+
+
+def fit_zoom(lat, lon, view_px: tuple = VIEW_PX, max_zoom: float = 16) -> float:
+    """
+    Maior zoom em que o miolo da cidade (percentis 1-99, para ignorar
+    pontos perdidos) cabe numa tela de view_px pixels
+    """
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    if len(lat) == 0:
+        return 1.0
+    la0, la1 = np.percentile(lat, [1, 99])
+    lo0, lo1 = np.percentile(lon, [1, 99])
+    x0, y1 = lod.mercator_xy(la0, lo0)
+    x1, y0 = lod.mercator_xy(la1, lo1)
+    # fração do mundo (0..1) ocupada pela cidade em cada eixo
+    dx = max(float(x1 - x0), 1e-9)
+    dy = max(float(y1 - y0), 1e-9)
+    zoom = min(np.log2(view_px[0] / (256 * dx)), np.log2(view_px[1] / (256 * dy)))
+    return float(np.clip(np.floor(zoom * 2) / 2, 0, max_zoom))
+
+
+def city_zoom(city: dict, data) -> float:
+    """Zoom do cadastro ou, se não houver, o que enquadra os dados"""
+    if city.get('zoom') is not None:
+        return city['zoom']
+    return fit_zoom(data['lat'], data['lon'])
@@ -0,0 +1,103 @@
+import numpy as np
+
+import lod
+
+#-----------------------------------------------------------------
+# ---------------CLUSTERS POR ZOOM---------------------------------
+#-----------------------------------------------------------------
+# Clusters hierárquicos (estilo supercluster) calculados uma vez por cidade
+# para todos os zooms 0..MAX_ZOOM. Cada ponto recebe um código de Morton
+# (z-order) da sua célula no zoom máximo; depois de ordenar pelos códigos,
+# as células de qualquer zoom menor são prefixos do código, então cada
+# cluster é um trecho contíguo da ordem. Contagem, centróide e custo médio
+# saem de np.add.reduceat, sem laço por cluster.
+
+MAX_ZOOM = lod.MAX_ZOOM
+CLUSTER_PX = 64
+CLUSTER_SHIFT = 2   # 256 / 64 = 2^2 células por tile
+_BITS = MAX_ZOOM + CLUSTER_SHIFT
+
+
+def _spread_bits(v: np.ndarray) -> np.ndarray:
+    # intercala zeros entre os bits (x -> x0x0x0...), para até 32 bits
+    v = v.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF),
+                        (4, 0x0F0F0F0F0F0F0F0F), (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton_codes(lat, lon) -> np.ndarray:
+    """Código de Morton de cada ponto na grade do zoom máximo (web mercator)"""
+    x, y = lod.mercator_xy(lat, lon)
+    cells = 1 << _BITS
+    ix = (x * cells).astype(np.uint64)
+    iy = (y * cells).astype(np.uint64)
+    return _spread_bits(ix) | (_spread_bits(iy) << np.uint64(1))
+
+
+class ClusterPyramid:
+    """
+    Clusters de todos os zooms em vetores únicos; o zoom z ocupa o trecho
+    offsets[z]:offsets[z+1]. start/count apontam para `order`, então os
+    anúncios de um cluster são order[start:start + count].
+    """
+
+    def __init__(self, lat, lon, custo):
+        lat = np.asarray(lat)
+        lon = np.asarray(lon)
+        custo = np.asarray(custo, dtype=np.float64)
+        codes = morton_codes(lat, lon)
+        self.order = np.argsort(codes, kind='stable').astype(np.int64)
+        codes = codes[self.order]
+        lat_s = lat[self.order].astype(np.float64)
+        lon_s = lon[self.order].astype(np.float64)
+        cost_s = custo[self.order]
+        # rank global do custo: com ele a mediana de cada cluster sai de uma ordenação inteira
+        cost_rank = np.empty(len(custo), np.int64)
+        cost_rank[np.argsort(cost_s, kind='stable')] = np.arange(len(custo))
+
+        parts = {k: [] for k in ('lat', 'lon', 'count', 'mean', 'median', 'start')}
+        offsets = [0]
+        for z in range(MAX_ZOOM + 1):
+            cell = codes >> np.uint64(2 * (MAX_ZOOM - z))
+            if len(cell):
+                start = np.flatnonzero(np.concatenate([[True], cell[1:] != cell[:-1]]))
+            else:
+                start = np.empty(0, np.int64)
+            count = np.diff(np.append(start, len(cell)))
+            group = np.repeat(np.arange(len(start)), count)
+
+            parts['start'].append(start)
+            parts['count'].append(count.astype(np.int32))
+            parts['lat'].append((np.add.reduceat(lat_s, start) / count).astype(np.float32) if len(start) else np.empty(0, np.float32))
+            parts['lon'].append((np.add.reduceat(lon_s, start) / count).astype(np.float32) if len(start) else np.empty(0, np.float32))
+            parts['mean'].append((np.add.reduceat(cost_s, start) / count).astype(np.float32) if len(start) else np.empty(0, np.float32))
+            # mediana: ordena por (cluster, rank do custo) e pega o(s) do meio
+            by_cost = np.argsort(group * len(cost_s) + cost_rank, kind='stable') if len(start) else np.empty(0, np.int64)
+            lo = cost_s[by_cost[start + (count - 1) // 2]] if len(start) else np.empty(0)
+            hi = cost_s[by_cost[start + count // 2]] if len(start) else np.empty(0)
+            parts['median'].append(((lo + hi) / 2).astype(np.float32))
+            offsets.append(offsets[-1] + len(start))
+
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        for k, v in parts.items():
+            setattr(self, k, np.concatenate(v))
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def at(self, zoom: float, bbox=None) -> np.ndarray:
+        """Índices (nestes vetores) dos clusters do zoom dado, opcionalmente só os do bbox"""
+        z = int(np.clip(np.floor(zoom), 0, MAX_ZOOM))
+        sel = np.arange(self.offsets[z], self.offsets[z + 1])
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            la, lo = self.lat[sel], self.lon[sel]
+            sel = sel[(la >= lat_min) & (la <= lat_max) & (lo >= lon_min) & (lo <= lon_max)]
+        return sel
+
+    def members(self, cluster: int) -> np.ndarray:
+        """Índices (linhas do store) dos anúncios de um cluster"""
+        s = self.start[cluster]
+        return self.order[s:s + self.count[cluster]]
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+
+#-----------------------------------------------------------------
+# ---------------DIVISÃO DO CSV EM FAIXAS DE BYTES-----------------
+#-----------------------------------------------------------------
+# Para ler um CSV grande em vários processos o arquivo é cortado em faixas
+# de bytes que terminam sempre num fim de registro. Um '\n' só fecha um
+# registro se estiver fora de aspas (descrições com quebra de linha vêm
+# entre aspas): conta-se as aspas antes de cada '\n' e, com número par,
+# ele está fora ("" escapado soma 2 e não muda a paridade).
+# A passada é só np.flatnonzero sobre blocos do arquivo mapeado em memória,
+# bem mais rápida que o parse, e já conta quantos registros vêm antes de
+# cada faixa (usado no nome padrão "Ponto i", igual à leitura sequencial).
+
+QUOTE = ord('"')
+NEWLINE = ord('\n')
+CR = ord('\r')
+BLOCK_BYTES = 64 << 20
+# faixas de até RANGE_BYTES (limita a memória de cada processo) e não
+# menores que MIN_RANGE_BYTES (arquivo pequeno não vale abrir processos)
+RANGE_BYTES = 64 << 20
+MIN_RANGE_BYTES = 4 << 20
+
+
+def record_ends(mm: np.ndarray, block: int = BLOCK_BYTES):
+    """
+    Gera, bloco a bloco, as posições dos '\n' que terminam registros.
+    Linhas em branco não contam (o pd.read_csv pula essas linhas)
+    """
+    parity = 0
+    for lo in range(0, len(mm), block):
+        buf = mm[lo:lo + block]
+        quotes = np.flatnonzero(buf == QUOTE)
+        nl = np.flatnonzero(buf == NEWLINE)
+        # aspas antes de cada \n (no bloco) + paridade herdada dos blocos anteriores
+        inside = (np.searchsorted(quotes, nl) + parity) % 2 == 1
+        nl = nl[~inside] + lo
+        parity = (parity + len(quotes)) % 2
+        prev = mm[np.maximum(nl - 1, 0)]
+        prev2 = mm[np.maximum(nl - 2, 0)]
+        blank = (nl == 0) | (prev == NEWLINE) | ((prev == CR) & ((nl == 1) | (prev2 == NEWLINE)))
+        yield nl[~blank]
+
+
+def n_parts(body: int, workers: int) -> int:
+    """Quantas faixas para body bytes: ao menos uma por processo, se o arquivo justificar"""
+    parts = max(workers, -(-body // RANGE_BYTES))
+    return int(max(1, min(parts, body // MIN_RANGE_BYTES)))
+
+
+def split_ranges(path, workers: int = 1, parts: int | None = None) -> list:
+    """
+    Faixas (início, fim, registros_antes) do corpo do CSV, depois do
+    cabeçalho. Cada faixa começa logo após um fim de registro e pode ser
+    lida sozinha com pd.read_csv(header=None).
+    parts: número de faixas (None = n_parts pelo tamanho e pelos processos)
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    mm = np.memmap(path, np.uint8, mode='r')
+    ranges = []
+    start = None
+    rows = 0        # registros (fora o cabeçalho) antes do bloco atual
+    first_row = 0   # registros antes da faixa aberta
+    targets = []
+    for nl in record_ends(mm):
+        if start is None:
+            if not len(nl):
+                continue
+            # o primeiro registro é o cabeçalho
+            start = int(nl[0]) + 1
+            nl = nl[1:]
+            body = size - start
+            k = parts or n_parts(body, workers)
+            targets = [start + body * i // k for i in range(1, k)]
+        while targets and len(nl) and nl[-1] >= targets[0]:
+            i = int(np.searchsorted(nl, targets.pop(0)))
+            end = int(nl[i]) + 1
+            if end > start:
+                ranges.append((start, end, first_row))
+                start = end
+                first_row = rows + i + 1
+        rows += len(nl)
+    if start is not None and start < size:
+        ranges.append((start, size, first_row))
+    return ranges
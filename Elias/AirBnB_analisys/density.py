@@ -0,0 +1,218 @@
+import numpy as np
+
+#-----------------------------------------------------------------
+# ---------------AGREGAÇÃO EM GRADE (LADO DO SERVIDOR)-------------
+#-----------------------------------------------------------------
+# Em vez de mandar cada anúncio para o Densitymapbox, soma os anúncios em
+# uma grade lat/lon regular com numpy e manda só as células ocupadas.
+# O custo no navegador passa a depender do tamanho da grade, não do número
+# de anúncios.
+
+GRID_BINS = 256
+# células abaixo dessa fração do máximo não vão para o mapa (cauda da suavização)
+MIN_FRAC = 1e-3
+
+
+def bounds(lat, lon, pad: float = 0.0) -> tuple:
+    """(lat_min, lon_min, lat_max, lon_max) dos pontos, com folga relativa `pad`"""
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    lat_min, lat_max = float(np.min(lat)), float(np.max(lat))
+    lon_min, lon_max = float(np.min(lon)), float(np.max(lon))
+    dlat = (lat_max - lat_min) * pad or 1e-6
+    dlon = (lon_max - lon_min) * pad or 1e-6
+    return lat_min - dlat, lon_min - dlon, lat_max + dlat, lon_max + dlon
+
+
+def grid_density(lat, lon, custo=None, bins: int = GRID_BINS, bbox=None, stat: str = 'sum', smooth: float = 0.0) -> dict:
+    """
+    Agrega os pontos em uma grade bins x bins (linhas = lat, colunas = lon).
+    stat: 'sum' (soma do custo), 'count' (número de anúncios) ou 'mean'
+    (custo médio da célula). smooth: desvio padrão gaussiano em células.
+    Devolve dict com values (2D), lat_edges e lon_edges.
+    """
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    if bbox is None:
+        bbox = bounds(lat, lon, pad=0.01)
+    lat_min, lon_min, lat_max, lon_max = bbox
+
+    # índice da célula de cada ponto (bincount é mais rápido que histogram2d)
+    iy = ((lat - lat_min) * (bins / (lat_max - lat_min))).astype(np.int64)
+    ix = ((lon - lon_min) * (bins / (lon_max - lon_min))).astype(np.int64)
+    inside = (iy >= 0) & (iy < bins) & (ix >= 0) & (ix < bins)
+    flat = iy[inside] * bins + ix[inside]
+
+    count = np.bincount(flat, minlength=bins * bins).astype(np.float64)
+    if stat == 'count' or custo is None:
+        values = count
+    else:
+        w = np.asarray(custo, dtype=np.float64)[inside]
+        values = np.bincount(flat, weights=w, minlength=bins * bins)
+    values = values.reshape(bins, bins)
+    count = count.reshape(bins, bins)
+
+    if smooth > 0:
+        values = smooth_grid(values, smooth)
+        count = smooth_grid(count, smooth)
+    if stat == 'mean' and custo is not None:
+        values = np.divide(values, count, out=np.zeros_like(values), where=count > 1e-12)
+
+    return dict(
+        values = values,
+        lat_edges = np.linspace(lat_min, lat_max, bins + 1),
+        lon_edges = np.linspace(lon_min, lon_max, bins + 1),
+    )
+
+
+def smooth_grid(values: np.ndarray, sigma: float) -> np.ndarray:
+    """Suavização gaussiana da grade pela mesma convolução via FFT do KDE"""
+    # a FFT deixa resíduos negativos da ordem de 1e-16
+    return np.maximum(fft_gaussian_filter(values, sigma, sigma), 0)
+
+
+def grid_points(grid: dict, min_frac: float = MIN_FRAC) -> tuple:
+    """
+    Centros (lat, lon) e valores das células com valor acima de min_frac do
+    máximo (a suavização deixa uma cauda de células quase zero), em float32
+    """
+    values = grid['values']
+    min_value = float(values.max()) * min_frac if values.size else 0.0
+    lat_c = (grid['lat_edges'][:-1] + grid['lat_edges'][1:]) / 2
+    lon_c = (grid['lon_edges'][:-1] + grid['lon_edges'][1:]) / 2
+    iy, ix = np.nonzero(values > min_value)
+    return (lat_c[iy].astype(np.float32), lon_c[ix].astype(np.float32),
+            values[iy, ix].astype(np.float32))
+
+
+def cell_radius_px(grid: dict, zoom: float, cells: float = 1.5) -> float:
+    """Raio (px) de `cells` células no zoom dado, para o Densitymapbox"""
+    dlon = float(grid['lon_edges'][1] - grid['lon_edges'][0])
+    px = dlon / 360.0 * 256 * 2 ** zoom
+    return float(np.clip(px * cells, 2, 50))
+
+
+#-----------------------------------------------------------------
+# ---------------KDE POR FFT--------------------------------------
+#-----------------------------------------------------------------
+# Densidade suavizada de verdade: os anúncios são somados numa grade fina
+# e a grade é convoluída com um núcleo gaussiano via FFT. O custo é
+# O(n) para montar a grade + O(G log G) na convolução, então não depende
+# do número de anúncios depois do bincount.
+# A superfície já sai suavizada: vai para o mapa com no máximo
+# KDE_MAX_CELLS células (coarsen) e raio de ~1 célula, para o Densitymapbox
+# não borrar de novo com o próprio núcleo.
+
+KDE_BINS = 512
+KDE_MAX_CELLS = 20_000
+
+
+def bandwidth(lat, lon) -> tuple:
+    """
+    Largura de banda (graus) por eixo pela regra de Silverman com dispersão
+    robusta: 0.9 * min(desvio, IQR/1.34) * n^(-1/5). Cidades mais espalhadas
+    ganham núcleo mais largo.
+    """
+    out = []
+    for v in (np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)):
+        n = len(v)
+        if n < 2:
+            out.append(1e-3)
+            continue
+        q25, q75 = np.percentile(v, [25, 75])
+        spread = min(float(np.std(v)), float(q75 - q25) / 1.34) or float(np.std(v))
+        out.append(max(0.9 * spread * n ** (-0.2), 1e-5))
+    return tuple(out)
+
+
+def _gaussian_1d(sigma: float) -> np.ndarray:
+    r = max(int(np.ceil(4 * sigma)), 1)
+    x = np.arange(-r, r + 1)
+    k = np.exp(-0.5 * (x / sigma) ** 2)
+    return k / k.sum()
+
+
+def fft_gaussian_filter(values: np.ndarray, sigma_y: float, sigma_x: float) -> np.ndarray:
+    """Convolução linear (sem dar a volta nas bordas) com gaussiana, via rfft2"""
+    gy, gx = _gaussian_1d(sigma_y), _gaussian_1d(sigma_x)
+    ny, nx = values.shape
+    # tamanho da convolução linear, arredondado para potência de 2 (FFT rápida)
+    py = 1 << int(np.ceil(np.log2(ny + len(gy) - 1)))
+    px = 1 << int(np.ceil(np.log2(nx + len(gx) - 1)))
+    kernel = np.outer(gy, gx)
+    out = np.fft.irfft2(np.fft.rfft2(values, (py, px)) * np.fft.rfft2(kernel, (py, px)), (py, px))
+    ry, rx = len(gy) // 2, len(gx) // 2
+    return out[ry:ry + ny, rx:rx + nx]
+
+
+def coarsen(grid: dict, factor: int) -> dict:
+    """Junta blocos factor x factor de células pela média (a borda é completada com zeros)"""
+    values = grid['values']
+    ny, nx = values.shape
+    my, mx = -(-ny // factor), -(-nx // factor)
+    padded = np.zeros((my * factor, mx * factor), values.dtype)
+    padded[:ny, :nx] = values
+    lat_edges, lon_edges = grid['lat_edges'], grid['lon_edges']
+    dlat = (lat_edges[1] - lat_edges[0]) * factor
+    dlon = (lon_edges[1] - lon_edges[0]) * factor
+    return dict(grid,
+        values = padded.reshape(my, factor, mx, factor).mean(axis=(1, 3)),
+        lat_edges = lat_edges[0] + dlat * np.arange(my + 1),
+        lon_edges = lon_edges[0] + dlon * np.arange(mx + 1),
+    )
+
+
+def _cells_shown(values: np.ndarray, min_frac: float = MIN_FRAC) -> int:
+    # quantas células o grid_points mandaria
+    return int((values > values.max() * min_frac).sum()) if values.size else 0
+
+
+def kde_grid(lat, lon, custo=None, bins: int = KDE_BINS, bbox=None, bw=None, stat: str = 'sum',
+             max_cells: int | None = KDE_MAX_CELLS) -> dict:
+    """
+    Superfície KDE da cidade numa grade bins x bins.
+    stat='sum': densidade ponderada pelo custo; 'count': densidade de anúncios;
+    'mean': custo médio suavizado (soma suavizada / contagem suavizada).
+    bw: (banda_lat, banda_lon) em graus; None = bandwidth(lat, lon).
+    max_cells: se mais células que isso passariam do MIN_FRAC, a grade é
+    engrossada (coarsen) até caber; None = grade inteira.
+    """
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    if bw is None:
+        bw = bandwidth(lat, lon)
+    if bbox is None:
+        # folga de 3 bandas para o núcleo não ser cortado na borda
+        lat_min, lon_min, lat_max, lon_max = bounds(lat, lon)
+        bbox = (lat_min - 3 * bw[0], lon_min - 3 * bw[1], lat_max + 3 * bw[0], lon_max + 3 * bw[1])
+    raw = grid_density(lat, lon, custo, bins=bins, bbox=bbox, stat='count' if stat == 'count' else 'sum')
+
+    cell_lat = (bbox[2] - bbox[0]) / bins
+    cell_lon = (bbox[3] - bbox[1]) / bins
+    sy, sx = bw[0] / cell_lat, bw[1] / cell_lon
+    values = fft_gaussian_filter(raw['values'], sy, sx)
+    if stat == 'mean' and custo is not None:
+        count = grid_density(lat, lon, None, bins=bins, bbox=bbox, stat='count')['values']
+        count = fft_gaussian_filter(count, sy, sx)
+        values = np.divide(values, count, out=np.zeros_like(values), where=count > 1e-9)
+    # a FFT deixa resíduos negativos da ordem de 1e-16
+    raw['values'] = np.maximum(values, 0)
+    raw['bandwidth'] = bw
+    if max_cells is not None:
+        shown = _cells_shown(raw['values'])
+        factor = int(np.ceil(np.sqrt(shown / max_cells))) if shown > max_cells else 1
+        while factor > 1:
+            small = coarsen(raw, factor)
+            if _cells_shown(small['values']) <= max_cells:
+                return small
+            factor += 1
+    return raw
+
+
+def bandwidth_radius_px(lat, lon, zoom: float) -> float:
+    """Raio do Densitymapbox (px) equivalente à banda da cidade no zoom dado"""
+    if len(lat) == 0:
+        return 20.0
+    _, h_lon = bandwidth(lat, lon)
+    px = h_lon / 360.0 * 256 * 2 ** zoom
+    return float(np.clip(2 * px, 3, 60))
@@ -0,0 +1,105 @@
+import base64
+import json
+import time
+
+import numpy as np
+import plotly.io as pio
+
+# plotly.js >= 2.28 entende arrays no formato {"dtype": "f4", "bdata": "<base64>"}
+# e decodifica direto para Float32Array, sem passar por texto decimal
+TYPED_ARRAY_MIN_PLOTLYJS = '2.28.0'
+# (o plotly.py 5.19 é o primeiro que embute um plotly.js assim)
+
+# caminhos (dentro de cada trace) dos arrays numéricos que vão em binário
+_ARRAY_PATHS = (('lat',), ('lon',), ('z',), ('customdata',), ('marker', 'size'), ('marker', 'color'))
+
+
+def plotlyjs_version() -> str:
+    """Versão do plotly.js que o plotly.py instalado grava no html (include_plotlyjs='cdn')"""
+    from plotly.offline import get_plotlyjs_version
+    return get_plotlyjs_version()
+
+
+def _version_tuple(v: str) -> tuple:
+    return tuple(int(p) for p in v.split('-')[0].split('.')[:3])
+
+
+def supports_typed_arrays(version: str | None = None) -> bool:
+    """True se o plotly.js (o instalado, por padrão) decodifica {dtype, bdata}"""
+    return _version_tuple(version or plotlyjs_version()) >= _version_tuple(TYPED_ARRAY_MIN_PLOTLYJS)
+
+
+def typed_array(values, dtype: str = 'f4') -> dict:
+    """Converte um vetor numérico em spec base64 little-endian do plotly.js"""
+    arr = np.ascontiguousarray(np.asarray(values, dtype=np.dtype(dtype).newbyteorder('<')))
+    return dict(dtype=dtype, bdata=base64.b64encode(arr.tobytes()).decode('ascii'))
+
+
+def _is_numeric_array(v) -> bool:
+    if isinstance(v, (str, dict)) or not hasattr(v, '__len__') or len(v) == 0:
+        return False
+    arr = np.asarray(v)
+    return arr.ndim == 1 and arr.dtype.kind in 'fiu'
+
+
+def encode_trace(trace: dict) -> dict:
+    """Troca os arrays numéricos do trace (lat/lon/z/marker) por float32 em base64"""
+    trace = dict(trace)
+    for path in _ARRAY_PATHS:
+        parent = trace
+        for key in path[:-1]:
+            if not isinstance(parent.get(key), dict):
+                parent = None
+                break
+            parent[key] = dict(parent[key])
+            parent = parent[key]
+        if parent is not None and _is_numeric_array(parent.get(path[-1])):
+            parent[path[-1]] = typed_array(parent[path[-1]])
+    return trace
+
+
+def encode_figure(fig) -> dict:
+    """Figura (go.Figure ou dict) com os traces em binário, pronta para pio.write_html(validate=False)"""
+    fig = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else dict(fig)
+    fig['data'] = [encode_trace(t) for t in fig['data']]
+    return fig
+
+
+def write_html(fig, path: str, **kw):
+    """Igual ao fig.write_html, mas com os arrays em base64"""
+    kw.setdefault('include_plotlyjs', 'cdn')
+    pio.write_html(encode_figure(fig), path, validate=False, **kw)
+
+
+def _data_json(fig) -> str:
+    fig = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else fig
+    return pio.json.to_json_plotly(fig['data'])
+
+
+def _decode(obj):
+    # equivalente em python do que o navegador faz: base64 -> buffer float32
+    if isinstance(obj, dict):
+        if 'bdata' in obj:
+            return np.frombuffer(base64.b64decode(obj['bdata']), dtype=obj['dtype'])
+        return {k: _decode(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_decode(v) for v in obj]
+    return obj
+
+
+def compare(fig, repeat: int = 3) -> dict:
+    """
+    Compara o tamanho do payload de dados (JSON decimal x base64) e o tempo
+    para decodificá-lo. O tempo é medido em python (json.loads + base64),
+    que serve como aproximação relativa do custo de parse no navegador.
+    """
+    report = {}
+    for mode, text in (('json', _data_json(fig)), ('binary', _data_json(encode_figure(fig)))):
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            _decode(json.loads(text))
+            best = min(best, time.perf_counter() - t0)
+        report[mode] = dict(bytes = len(text.encode('utf-8')), parse_s = round(best, 4))
+    report['ratio_bytes'] = round(report['binary']['bytes'] / max(report['json']['bytes'], 1), 3)
+    return report
@@ -0,0 +1,114 @@
+import gzip
+import json
+import os
+import re
+
+import plotly.io as pio
+
+import encoding
+
+#-----------------------------------------------------------------
+# ---------------EXPORTAÇÃO COM CARGA SOB DEMANDA------------------
+#-----------------------------------------------------------------
+# O html leva só o layout, o menu e um trace vazio por visão de cada
+# cidade. Os dados de cada cidade vão para um arquivo .json.gz ao lado
+# do html, baixado só quando a cidade é escolhida no menu. A primeira
+# pintura custa o mesmo com 2 ou 50 cidades.
+#
+# Como o navegador busca os arquivos com fetch, a pasta precisa ser
+# servida por http (ex.: python -m http.server); file:// é bloqueado.
+
+# chaves mantidas no trace vazio do html (o resto chega no arquivo da cidade)
+_PLACEHOLDER_KEYS = ('type', 'name', 'visible', 'meta')
+
+LAZY_JS = """
+var gd = document.getElementById('{plot_id}');
+var files = __FILES__;
+var loaded = {};
+function loadCity(c) {
+    if (loaded[c]) { return loaded[c]; }
+    loaded[c] = fetch(files[c]).then(function (r) {
+        if (!r.ok) { throw new Error(files[c] + ': ' + r.status); }
+        var body = r.body.pipeThrough(new DecompressionStream('gzip'));
+        return new Response(body).json();
+    }).then(function (pair) {
+        var point = pair[0], heat = pair[1];
+        // calor sem dados próprios: usa os arrays do trace de pontos
+        if (heat.meta && heat.meta.data_from !== undefined) {
+            heat.lat = point.lat;
+            heat.lon = point.lon;
+            heat.z = point.customdata;
+        }
+        [point, heat].forEach(function (t, k) {
+            var i = 2 * c + k;
+            t.visible = gd.data[i].visible;
+            gd.data[i] = t;
+        });
+        return Plotly.react(gd, gd.data, gd.layout);
+    }).catch(function (err) {
+        delete loaded[c];
+        console.error('falha ao carregar a cidade', err);
+    });
+    return loaded[c];
+}
+gd.on('plotly_buttonclicked', function (ev) { loadCity(Math.floor(ev.active / 2)); });
+loadCity(0);
+"""
+
+
+def slug(label: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', label.lower()).strip('-') or 'cidade'
+
+
+def placeholder(trace: dict) -> dict:
+    """Trace vazio com o mesmo tipo/nome/visibilidade do original"""
+    out = {k: trace[k] for k in _PLACEHOLDER_KEYS if k in trace}
+    out.update(lat=[], lon=[])
+    return out
+
+
+def write_city_file(path: str, traces: list, binary: bool = False):
+    """Grava os traces de uma cidade em json compactado com gzip"""
+    if binary:
+        traces = [encoding.encode_trace(t) for t in traces]
+    data = pio.json.to_json_plotly(traces).encode('utf-8')
+    with gzip.open(path, 'wb', compresslevel=6) as f:
+        f.write(data)
+
+
+def write_lazy_html(fig, labels: list, out_html: str, binary: bool = False, keys: list | None = None, **kw) -> list:
+    """
+    Grava o html com traces vazios e um arquivo por cidade em <html>_dados/.
+    fig: figura do main.assemble_figure (2 traces por cidade, na ordem de labels).
+    keys: chave de cada cidade (main.build_cities); o arquivo leva a chave no
+    nome e não é regravado se já existir. Arquivos antigos são apagados.
+    Devolve os caminhos dos arquivos da figura.
+    """
+    fig = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else dict(fig)
+    data = fig['data']
+    base = os.path.splitext(out_html)[0]
+    folder = f"{base}_dados"
+    os.makedirs(folder, exist_ok=True)
+
+    files, urls, placeholders = [], [], []
+    for c, label in enumerate(labels):
+        pair = data[2 * c:2 * c + 2]
+        key = keys[c] if keys else None
+        name = f"{c:03d}-{slug(label)}-{key}{'-b' if binary else ''}.json.gz" if key else f"{c:03d}-{slug(label)}.json.gz"
+        path = os.path.join(folder, name)
+        if key is None or not os.path.exists(path):
+            write_city_file(path, pair, binary)
+        files.append(path)
+        # url relativa ao html
+        urls.append(f"{os.path.basename(folder)}/{name}")
+        placeholders += [placeholder(t) for t in pair]
+
+    for old in os.listdir(folder):
+        if old.endswith('.json.gz') and os.path.join(folder, old) not in files:
+            os.remove(os.path.join(folder, old))
+
+    fig['data'] = placeholders
+    kw.setdefault('include_plotlyjs', 'cdn')
+    kw['post_script'] = LAZY_JS.replace('__FILES__', json.dumps(urls))
+    pio.write_html(fig, out_html, validate=False, **kw)
+    return files
@@ -0,0 +1,118 @@
+import numpy as np
+
+#-----------------------------------------------------------------
+# ---------------NÍVEL DE DETALHE POR ZOOM (LOD)-------------------
+#-----------------------------------------------------------------
+# Pirâmide de grades sobre a projeção web mercator (a mesma do mapa).
+# No zoom z o mundo tem 2^z tiles de 256px; cada célula da grade tem
+# CELL_PX pixels, então a grade do zoom z tem 2^(z + CELL_SHIFT) células
+# por eixo e cada nível divide a célula do nível anterior em 4.
+#
+# Cada ponto recebe uma chave aleatória ponderada pelo custo
+# (u^(1/custo), amostragem de Efraimidis-Spirakis). O representante de uma
+# célula é o ponto de maior chave. Como as grades são aninhadas, quem é o
+# maior de uma célula grande também é o maior da sub-célula: basta guardar,
+# para cada ponto, o menor zoom em que ele vira representante (min_zoom).
+
+MAX_ZOOM = 18
+# células de 8px: no zoom z fica no máximo ~1 representante por 8x8 px de
+# tela, da ordem do tamanho de um marcador. É o que o servidor Dash mostra
+# por viewport (query/select); o html estático completa o orçamento (fill)
+CELL_PX = 8
+CELL_SHIFT = 5   # 256 / 8 = 2^5 células por tile
+POINT_BUDGET = 20_000
+
+
+def mercator_xy(lat, lon):
+    """lat/lon em graus -> x, y normalizados em [0, 1) (origem no canto superior esquerdo)"""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878)
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)
+    return np.clip(x, 0, 1 - 1e-12), np.clip(y, 0, 1 - 1e-12)
+
+
+class LodIndex:
+    """
+    Índice de nível de detalhe de uma cidade: min_zoom (uint8) e a ordem por
+    chave, mais as coordenadas nessa ordem para o filtro de viewport.
+    """
+
+    def __init__(self, lat, lon, custo=None, max_zoom: int = MAX_ZOOM, seed: int = 0):
+        lat = np.asarray(lat)
+        lon = np.asarray(lon)
+        n = len(lat)
+        self.max_zoom = max_zoom
+
+        rng = np.random.default_rng(seed)
+        if custo is None:
+            w = np.ones(n)
+        else:
+            w = np.asarray(custo, dtype=np.float64)
+            w = np.where(np.isfinite(w) & (w > 0), w, 0)
+            w = np.maximum(w, w.max() * 1e-6 if n and w.max() > 0 else 1.0)
+        # log(u)/w mantém a mesma ordem de u^(1/w) sem underflow
+        key = np.log(rng.random(n)) / w
+        # order: pontos do mais para o menos importante
+        self.order = np.argsort(-key, kind='stable').astype(np.int64)
+
+        x, y = mercator_xy(lat, lon)
+        min_zoom = np.full(n, max_zoom + 1, dtype=np.uint8)
+        xs, ys = x[self.order], y[self.order]
+        for z in range(max_zoom + 1):
+            cells = 1 << (z + CELL_SHIFT)
+            cell = (xs * cells).astype(np.int64) * cells + (ys * cells).astype(np.int64)
+            # primeira ocorrência de cada célula na ordem = maior chave da célula
+            _, first = np.unique(cell, return_index=True)
+            pos = self.order[first]
+            min_zoom[pos] = np.minimum(min_zoom[pos], z)
+        self.min_zoom = min_zoom
+        # min_zoom e coordenadas na ordem de importância, para filtrar sem indexação extra
+        self._zoom_sorted = min_zoom[self.order]
+        self._lat_sorted = lat[self.order]
+        self._lon_sorted = lon[self.order]
+        # posição de cada ponto na ordem de importância (para select)
+        self.rank = np.empty(n, dtype=np.int64)
+        self.rank[self.order] = np.arange(n)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def query(self, zoom: float, bbox=None, budget: int = POINT_BUDGET) -> np.ndarray:
+        """
+        Índices dos pontos a mostrar no zoom/viewport dados.
+        bbox = (lat_min, lon_min, lat_max, lon_max); None = cidade inteira.
+        Nunca devolve mais que `budget` pontos (os de maior chave ficam).
+        """
+        z = int(np.clip(np.floor(zoom), 0, self.max_zoom))
+        # depois do zoom máximo todos os pontos entram
+        keep = self._zoom_sorted <= z if zoom <= self.max_zoom else np.ones(len(self), bool)
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            la, lo = self._lat_sorted, self._lon_sorted
+            keep &= (la >= lat_min) & (la <= lat_max) & (lo >= lon_min) & (lo <= lon_max)
+        idx = self.order[keep]
+        return idx[:budget] if budget is not None else idx
+
+    def fill(self, budget: int = POINT_BUDGET) -> np.ndarray:
+        """
+        Para o html estático, que não pode pedir mais pontos depois: usa o
+        orçamento inteiro. Primeiro os representantes dos zooms menores
+        (cobertura da cidade toda), depois os dos zooms seguintes, cada
+        nível em ordem de chave; ao aproximar o mapa aparecem mais pontos.
+        """
+        by_level = np.argsort(self._zoom_sorted, kind='stable')
+        return self.order[by_level[:budget]]
+
+    def select(self, idx: np.ndarray, zoom: float, budget: int = POINT_BUDGET) -> np.ndarray:
+        """
+        Igual ao query, mas partindo de candidatos já filtrados por outro
+        índice (ex.: spatial.GridIndex.bbox_query): evita varrer a cidade toda.
+        """
+        idx = np.asarray(idx)
+        if zoom <= self.max_zoom:
+            z = int(np.clip(np.floor(zoom), 0, self.max_zoom))
+            idx = idx[self.min_zoom[idx] <= z]
+        if budget is not None and len(idx) > budget:
+            idx = idx[np.argpartition(self.rank[idx], budget - 1)[:budget]]
+        return idx[np.argsort(self.rank[idx], kind='stable')]
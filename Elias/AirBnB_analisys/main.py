@@ -1,11 +1,36 @@
 
+import argparse
+import glob
+import hashlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import pandas as pd
 import numpy as np
 import plotly.graph_objs as go
 
+import cache
+import cities
+import clusters
+import csvsplit
+import density
+import encoding
+import export
+import lod
+import profiling
+import scale
+import sketch
+import store
+import validate
+
 folder = 'C:/Users/sabado/Desktop/Elias/AirBnB_analisys/'
-t_ny = 'ny.csv'
-t_rj = 'rj.csv'
 
 #-----------------------------------------------------------------
 # ---------------HIGENIZAÇÃO DOS DADOS---------------------------
@@ -13,54 +38,238 @@ t_rj = 'rj.csv'
 
 
 
-def standartize_columns(df: pd.DataFrame) -> pd.DataFrame: 
+# tamanho padrão dos blocos lidos no modo streaming (linhas por bloco)
+CHUNK_SIZE = 200_000
+
+LAT_CANDIDATES = ['lat', 'latitude', 'Latitude', 'Lat', 'LATITUDE']
+LON_CANDIDATES = ['LON', 'lon', 'Longitude', 'Long', 'Lng', 'longitude']
+COST_CANDIDATES = ['custos', 'cost', 'preço', 'preço', 'price', 'valor', 'valor_total' ]
+NAME_CANDIDATES = ['nome', 'descricao', 'titulo', 'name', 'titlle', 'local', 'place']
+
+
+def pick(colnames, candidates):
+    #colnames: lista de nomes das colunas da tabela 
+    #candidates: lista de possiveis nomes de colunas a serem encontrado
+    for c in candidates:
+        #percorre cada candidato (c) dentro da lista de candidatos 
+        if c in colnames:
+            # se o candidato for extremamente igual a um dos nomes de colunas em colnames
+            return c 
+    #...retorna esse candidato imediatamente     
+    for c in candidates:
+        for col in colnames:
+            if c.lower() in col.lower():
+                return col
+    return None
+
+
+def detect_columns(colnames) -> dict:
     """
-    Tenta detectar as colunas latitude de longitude, custos e nome 
-    aceita varios nomes comuns como lat/latitude custo, valor, etc
-    Preenche custos ausentes com a mediana (ou 1 se tudo for ausente)
+    Resolve quais colunas da tabela correspondem a lat, lon, custo e nome.
+    Levanta ValueError se latitude/longitude não forem encontradas
     """
+    colnames = list(colnames)
+    cols = dict(
+        lat = pick(colnames, LAT_CANDIDATES),
+        lon = pick(colnames, LON_CANDIDATES),
+        custo = pick(colnames, COST_CANDIDATES),
+        nome = pick(colnames, NAME_CANDIDATES),
+    )
+    if cols['lat'] is None or cols['lon'] is None:
+        raise ValueError(f'Não encontrei colunas de latitude e/ou longitude na lista de colunas{colnames}')
+    return cols
 
-    df = df.copy()
-
-    lat_candidates = ['lat', 'latitude', 'Latitude', 'Lat', 'LATITUDE']
-    lon_candidates = ['LON', 'lon', 'Longitude', 'Long', 'Lng', 'longitude']
-    cost_candidates = ['custos', 'cost', 'preço', 'preço', 'price', 'valor', 'valor_total' ]
-    name_candidates = ['nome', 'descricao', 'titulo', 'name', 'titlle', 'local', 'place']
-
-    def pick(colnames, candidates):
-        #colnames: lista de nomes das colunas da tabela 
-        #candidates: lista de possiveis nomes de colunas a serem encontrado
-        for c in candidates:
-            #percorre cada candidato (c) dentro da lista de candidatos 
-            if c in colnames:
-                # se o candidato for extremamente igual a um dos nomes de colunas em colnames
-                return c 
-        #...retorna esse candidato imediatamente     
-        for c in candidates:
-            for col in colnames:
-                if c.lower() in col.lower():
-                    return col
-        return None
 
-   
-    lat_col = pick(df.columns, lat_candidates)
-    lon_col = pick(df.columns, lon_candidates)
-    cost_col = pick(df.columns, cost_candidates)
-    name_col = pick(df.columns, name_candidates)
+CURRENCY_BLOCK = 1 << 20
+# linhas lidas pelo sniff_columns para decidir o separador decimal do arquivo
+SNIFF_ROWS = 100_000
+# textos maiores que isso vão para um bloco próprio (o laço é por coluna de caractere)
+CURRENCY_MAX_WIDTH = 32
 
-    if lat_col is None or lon_col is None:
-        raise ValueError(f'Não encontrei colunas de latitude e/ou longitude na lista de colunas{list(df.columns)}')
 
-    out = pd.DataFrame()
-    out['lat'] = pd.to_numeric(df[lat_col], errors= 'coerce')
-    out['lon'] = pd.to_numeric(df[lon_col], errors= 'coerce')
-    out['custo'] = pd.to_numeric(df[cost_col], errors= 'coerce') if cost_col is not None else np.nan
-    out['nome'] = df [name_col].astype(str) if name_col is not None else [f"Ponto {i}" for i in range(len(df))]
+def _currency_block(u: np.ndarray) -> tuple:
+    """
+    Núcleo do parse_currency para um bloco de strings (dtype '<U').
+    O bloco vira uma matriz de códigos unicode transposta (caractere x linha)
+    e o laço em python anda só pelas posições de caractere (~10), cada passo
+    operando em todas as linhas de uma vez.
+    Linhas ambíguas ("1,234" ou "1.234": um separador seguido de 3 dígitos)
+    saem como milhar; o chamador divide por 1000 se a coluna usar aquele
+    separador como decimal.
+    Negativo: um '-' antes do primeiro dígito ou o número entre parênteses
+    ("(5.00)", formato contábil). Sinal no meio ("3-4"), mais de um sinal ou
+    parênteses desbalanceados saem NaN.
+    """
+    n = len(u)
+    w = u.dtype.itemsize // 4
+    if n == 0 or w == 0:
+        return np.full(n, np.nan), np.zeros(n, bool), np.zeros(n, bool), np.zeros(n, bool), 0, 0
+    chars = np.ascontiguousarray(u.view(np.uint32).reshape(n, w).T)
+
+    # 1ª passada: quantos separadores, onde está o último e quantos dígitos vêm depois
+    n_c = np.zeros(n, np.int32)
+    n_d = np.zeros(n, np.int32)
+    last_c = np.full(n, -1, np.int32)
+    last_d = np.full(n, -1, np.int32)
+    after_c = np.zeros(n, np.int32)
+    after_d = np.zeros(n, np.int32)
+    total = np.zeros(n, np.int32)
+    first_dig = np.full(n, w, np.int32)
+    last_dig = np.full(n, -1, np.int32)
+    n_minus = np.zeros(n, np.int32)
+    last_minus = np.full(n, -1, np.int32)
+    n_open = np.zeros(n, np.int32)
+    n_close = np.zeros(n, np.int32)
+    last_open = np.full(n, -1, np.int32)
+    last_close = np.full(n, -1, np.int32)
+    has_e = np.zeros(n, bool)
+    for j in range(w):
+        ch = chars[j]
+        dig = (ch >= 48) & (ch <= 57)
+        com = ch == 44
+        dot = ch == 46
+        n_c += com
+        n_d += dot
+        last_c[com] = j
+        last_d[dot] = j
+        after_c[com] = 0
+        after_d[dot] = 0
+        after_c += dig
+        after_d += dig
+        total += dig
+        first_dig[dig & (first_dig == w)] = j
+        last_dig[dig] = j
+        minus = ch == 45
+        n_minus += minus
+        last_minus[minus] = j
+        opening = ch == 40
+        closing = ch == 41
+        n_open += opening
+        n_close += closing
+        last_open[opening] = j
+        last_close[closing] = j
+        has_e |= (ch == 69) | (ch == 101)
+
+    # sinal: no máximo um '-', antes dos dígitos; parênteses só em volta do número
+    minus = n_minus == 1
+    paren = (n_open == 1) & (n_close == 1) & (last_open < first_dig) & (last_close > last_dig)
+    bad = ((n_minus > 1) | (minus & (last_minus > first_dig))
+           | (((n_open > 0) | (n_close > 0)) & ~paren) | (minus & paren))
+    neg = minus | paren
+
+    both = (n_c > 0) & (n_d > 0)
+    only_c = (n_c == 1) & (n_d == 0)
+    only_d = (n_d == 1) & (n_c == 0)
+    amb_c = only_c & (after_c == 3)
+    amb_d = only_d & (after_d == 3)
+    # separador decimal: com os dois, o mais à direita; com um só (uma vez), ele
+    # mesmo, salvo o caso ambíguo; repetido ("1.234.567") é sempre milhar
+    c_dec = (both & (last_c > last_d)) | (only_c & ~amb_c)
+    d_dec = (both & (last_d > last_c)) | (only_d & ~amb_d)
+    dec_pos = np.where(c_dec, last_c, np.where(d_dec, last_d, w))
+
+    votes_c = int((((both & (last_c > last_d)) | (only_c & (after_c <= 2)) | ((n_d > 1) & (n_c == 0))) & ~bad).sum())
+    votes_d = int((((both & (last_d > last_c)) | (only_d & (after_d <= 2)) | ((n_c > 1) & (n_d == 0))) & ~bad).sum())
+
+    # 2ª passada: todos os dígitos viram um inteiro (exato em float64) e o
+    # valor é inteiro / 10^casas, o mesmo arredondamento do float("1234.56")
+    mant = np.zeros(n)
+    n_frac = np.zeros(n, np.int32)
+    for j in range(w):
+        ch = chars[j]
+        dig = (ch >= 48) & (ch <= 57)
+        mant = np.where(dig, mant * 10 + (ch.astype(np.float64) - 48), mant)
+        n_frac += dig & (j > dec_pos)
+    value = mant / 10.0 ** n_frac
+    value[(total == 0) | bad] = np.nan
+    value = np.where(neg, -value, value)
+    # "1e-05": o chamador refaz essas linhas com o to_numeric
+    sci = has_e & (total > 0)
+    return value, amb_c, amb_d, sci, votes_c, votes_d
+
+
+def _parse_blocks(texts: np.ndarray) -> tuple:
+    # _currency_block em blocos de CURRENCY_BLOCK linhas, com os votos somados
+    out = np.full(len(texts), np.nan)
+    amb_c = np.zeros(len(texts), bool)
+    amb_d = np.zeros(len(texts), bool)
+    sci = np.zeros(len(texts), bool)
+    votes_c = votes_d = 0
+    for i in range(0, len(texts), CURRENCY_BLOCK):
+        u = np.array(texts[i:i + CURRENCY_BLOCK], dtype=str)
+        rows = np.arange(i, i + len(u))
+        long = np.char.str_len(u) > CURRENCY_MAX_WIDTH
+        parts = [(rows[~long], u[~long].astype(f'<U{CURRENCY_MAX_WIDTH}'))] if long.any() else [(rows, u)]
+        if long.any():
+            parts.append((rows[long], u[long]))
+        for r, part in parts:
+            v, ac, ad, sc, vc, vd = _currency_block(part)
+            out[r] = v
+            amb_c[r] = ac
+            amb_d[r] = ad
+            sci[r] = sc
+            votes_c += vc
+            votes_d += vd
+    return out, amb_c, amb_d, sci, votes_c, votes_d
+
+
+def currency_decimal(values) -> str:
+    """Separador decimal (',' ou '.') de uma coluna de preços, pelos valores sem ambiguidade"""
+    *_, votes_c, votes_d = _parse_blocks(pd.Series(values).dropna().to_numpy(object))
+    return ',' if votes_c > votes_d else '.'
+
+
+def parse_currency(values, decimal: str | None = None) -> pd.Series:
+    """
+    Converte preços em texto ("$1,234.00", "R$ 350,00", "1.234,5") para float.
+    Colunas numéricas passam direto pelo to_numeric; texto é tratado em blocos
+    de CURRENCY_BLOCK linhas por _currency_block (numpy, sem laço por linha).
+    decimal: ',' ou '.'; None decide pelos valores sem ambiguidade de values.
+    Quem lê o arquivo em partes passa o decimal decidido uma vez por arquivo
+    (sniff_columns), senão cada bloco poderia votar diferente
+    """
+    s = pd.Series(values)
+    if s.dtype.kind in 'fiub':
+        return pd.to_numeric(s, errors='coerce').astype(float)
+
+    texts = s.to_numpy(object)
+    out, amb_c, amb_d, sci, votes_c, votes_d = _parse_blocks(texts)
+    if decimal is None:
+        decimal = ',' if votes_c > votes_d else '.'
+    amb = amb_c if decimal == ',' else amb_d
+    out[amb] /= 1000
+
+    # notação científica ("1e-05") o to_numeric entende melhor
+    if sci.any():
+        num = pd.to_numeric(pd.Series(texts[sci]), errors='coerce').to_numpy(float)
+        out[sci] = np.where(np.isnan(num), out[sci], num)
+    return pd.Series(out, index=s.index)
+
+
+def normalize_frame(df: pd.DataFrame, cols: dict, offset: int = 0) -> pd.DataFrame:
+    """
+    Converte as colunas já detectadas para o esquema lat/lon/custo/nome
+    e remove linhas sem coordenada. NÃO preenche custos ausentes.
+    offset: posição da primeira linha de df no arquivo (usado no nome padrão)
+    """
+    out = pd.DataFrame(index=df.index)
+    out['lat'] = pd.to_numeric(df[cols['lat']], errors= 'coerce')
+    out['lon'] = pd.to_numeric(df[cols['lon']], errors= 'coerce')
+    # custo pode vir como texto de moeda ("$1,234.00", "R$ 350,00")
+    out['custo'] = parse_currency(df[cols['custo']], cols.get('decimal')) if cols['custo'] is not None else np.nan
+    out['nome'] = df[cols['nome']].astype(str) if cols['nome'] is not None else [f"Ponto {i}" for i in range(offset, offset + len(df))]
     # remove linhas vazias 
-    out = out.dropna(subset=['lat' , 'lon'  ]).reset_index(drop=True)
+    return out.dropna(subset=['lat' , 'lon'  ]).reset_index(drop=True)
+
 
+def fill_missing_cost(out: pd.DataFrame, med: float | None = None) -> pd.DataFrame:
+    """
+    Preenche custos ausentes com a mediana (ou 1 se tudo for ausente).
+    med: mediana já conhecida (ex.: do sketch do modo streaming); None = exata
+    """
     if out['custo'].notna().any():
-        med = float(out['custo'].median())
+        if med is None:
+            med = float(out['custo'].median())
         if not np.isfinite(med):
             med = 1.0
         out['custo'] = out['custo'].fillna(med)
@@ -68,147 +277,862 @@ def standartize_columns(df: pd.DataFrame) -> pd.DataFrame:
         out['custo'] = 1.0
     return out
 
+
+def standartize_columns(df: pd.DataFrame) -> pd.DataFrame: 
+    """
+    Tenta detectar as colunas latitude de longitude, custos e nome 
+    aceita varios nomes comuns como lat/latitude custo, valor, etc
+    Preenche custos ausentes com a mediana (ou 1 se tudo for ausente)
+    Coordenadas inválidas saem pelo validate.clean_frame
+    """
+    # não copia o df inteiro: só as 4 colunas usadas são convertidas
+    out = validate.clean_frame(normalize_frame(df, detect_columns(df.columns)))
+    return fill_missing_cost(out)
+
+
+def sniff_columns(path, center=None, **read_kw) -> dict:
+    """
+    Lê o cabeçalho do CSV e resolve as colunas lat/lon/custo/nome. Numa
+    amostra das primeiras SNIFF_ROWS linhas decide também o que vale para o
+    arquivo inteiro, para todos os blocos/faixas usarem o mesmo:
+    cols['decimal'] (separador decimal do custo) e cols['coords'] (plano da
+    validação das coordenadas, validate.plan_coordinates; center: [lat, lon]
+    esperado da cidade)
+    """
+    header = pd.read_csv(path, nrows=0, **read_kw)
+    cols = detect_columns(header.columns)
+    usecols = list(dict.fromkeys(cols[k] for k in ('lat', 'lon', 'custo') if cols[k] is not None))
+    sample = pd.read_csv(path, usecols=usecols, dtype=str, nrows=SNIFF_ROWS, **read_kw)
+    if cols['custo'] is not None:
+        cols['decimal'] = currency_decimal(sample[cols['custo']])
+    lat = pd.to_numeric(sample[cols['lat']], errors='coerce').to_numpy(float)
+    lon = pd.to_numeric(sample[cols['lon']], errors='coerce').to_numpy(float)
+    has = ~(np.isnan(lat) | np.isnan(lon))
+    cols['coords'] = validate.plan_coordinates(lat[has], lon[has], center)
+    return cols
+
+
+def projection(cols: dict, typed: bool = True) -> dict:
+    """
+    Argumentos de leitura para carregar apenas as colunas resolvidas.
+    typed=True já lê as coordenadas como float32 e o nome como texto
+    (o custo fica sem dtype porque pode vir como "$1,234.00")
+    """
+    usecols = list(dict.fromkeys(cols[k] for k in ('lat', 'lon', 'custo', 'nome') if cols[k] is not None))
+    dtype = {}
+    if typed:
+        dtype[cols['lat']] = np.float32
+        dtype[cols['lon']] = np.float32
+    if cols['nome'] is not None and cols['nome'] not in dtype:
+        dtype[cols['nome']] = str
+    return dict(usecols=usecols, dtype=dtype)
+
+
+def iter_standardized_chunks(path, chunksize: int = CHUNK_SIZE, cols: dict | None = None, typed: bool = True, **read_kw):
+    """
+    Lê o CSV em blocos de `chunksize` linhas e devolve cada bloco já
+    normalizado e validado pelo plano do arquivo (cols['coords']), sem
+    preencher custos. Só as colunas resolvidas no cabeçalho são lidas do
+    arquivo. As contagens da validação ficam em part.attrs['coord_checks']
+    """
+    if cols is None:
+        cols = sniff_columns(path, **read_kw)
+    read_kw = {**projection(cols, typed), **read_kw}
+    offset = 0
+    reader = pd.read_csv(path, chunksize=chunksize, **read_kw)
+    while True:
+        with profiling.stage('csv_parse'):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        with profiling.stage('standardize'):
+            part = normalize_frame(chunk, cols, offset)
+        with profiling.stage('validate'):
+            part = validate.clean_frame(part, plan=cols['coords'])
+        yield part
+        offset += len(chunk)
+
+
+def read_city_streaming(path, chunksize: int = CHUNK_SIZE, **read_kw) -> pd.DataFrame:
+    """
+    Modo streaming: o arquivo nunca é carregado inteiro. Cada bloco é reduzido
+    para lat/lon/custo (float32) + nome e só então acumulado, então o pico de
+    memória depende do tamanho do bloco e não do número de colunas do arquivo.
+    A mediana do custo vem de um sketch KLL atualizado a cada bloco, já
+    validado (coordenadas descartadas não entram na mediana).
+    """
+    lat, lon, custo, nome = [], [], [], []
+    costs = sketch.KLLSketch()
+    checks = None
+    for part in iter_standardized_chunks(path, chunksize, **read_kw):
+        checks = validate.add_counts(checks, part.attrs['coord_checks'])
+        costs.update(part['custo'].to_numpy())
+        lat.append(part['lat'].to_numpy(np.float32))
+        lon.append(part['lon'].to_numpy(np.float32))
+        custo.append(part['custo'].to_numpy(np.float32))
+        nome.append(part['nome'].to_numpy(object))
+
+    if not lat:
+        out = pd.DataFrame({
+            'lat': np.empty(0, np.float32), 'lon': np.empty(0, np.float32),
+            'custo': np.empty(0, np.float32), 'nome': np.empty(0, object),
+        })
+    else:
+        out = pd.DataFrame({
+            'lat': np.concatenate(lat),
+            'lon': np.concatenate(lon),
+            'custo': np.concatenate(custo),
+            'nome': np.concatenate(nome),
+        })
+    out.attrs['coord_checks'] = checks
+    return fill_missing_cost(out, costs.median() if len(costs) else None)
+
+
+def load_city(path, chunksize: int | None = CHUNK_SIZE, backend: str = 'pandas', center=None) -> pd.DataFrame:
+    """
+    Carrega e padroniza uma cidade lendo só as colunas necessárias.
+    chunksize=None lê o arquivo de uma vez
+    backend: 'pandas', 'parallel', 'arrow' ou 'polars' (ver read_city_backend)
+    center: [lat, lon] esperado da cidade (cadastro), para a troca de eixos
+    Em todos os caminhos as coordenadas passam pela validação (plano único
+    do arquivo, cols['coords']) antes da mediana que preenche os custos
+    """
+    cols = sniff_columns(path, center)
+    if backend != 'pandas':
+        df = read_city_backend(path, cols, backend)
+    else:
+        try:
+            df = _load_projected(path, cols, chunksize, typed=True)
+        except ValueError:
+            # coordenada com texto no meio: relê sem forçar float32 e deixa o to_numeric tratar
+            df = _load_projected(path, cols, chunksize, typed=False)
+    if not df.attrs['coord_checks']['eixos_verificados']:
+        warnings.warn(f"{path}: não deu para verificar se lat/lon estão trocados; "
+                      f"informe o centro da cidade (\"center\": [lat, lon]) no cadastro", stacklevel=2)
+    return df
+
+
+def open_city(city: dict, folder: str = folder, cache_dir: str | None = None,
+              backend: str = 'pandas') -> store.CityStore:
+    """
+    store.CityStore de uma cidade do cadastro: lê o CSV só se o cache estiver
+    vencido ou tiver sido validado com outro centro esperado
+    """
+    loader = partial(load_city, backend=backend, center=city.get('center'))
+    data = store.open_city(os.path.join(folder, city['file']), loader, cache_dir)
+    checks = data.meta.get('coord_checks') or {}
+    if checks.get('centro_esperado') != city.get('center'):
+        data = store.open_city(os.path.join(folder, city['file']), loader, cache_dir, refresh=True)
+    return data
+
+
+def _load_projected(path, cols: dict, chunksize: int | None, typed: bool) -> pd.DataFrame:
+    if chunksize is None:
+        with profiling.stage('csv_parse'):
+            df = pd.read_csv(path, **projection(cols, typed))
+        with profiling.stage('standardize'):
+            df = normalize_frame(df, cols)
+        with profiling.stage('validate'):
+            df = validate.clean_frame(df, plan=cols['coords'])
+        with profiling.stage('standardize'):
+            return fill_missing_cost(df)
+    return read_city_streaming(path, chunksize, cols=cols, typed=typed)
+
+#----------------------BACKENDS PARALELOS---------------------------
+# 'parallel': o próprio pandas em vários processos, cada um lendo uma faixa
+# de bytes do arquivo (csvsplit). 'arrow' / 'polars' (opcionais): o CSV é
+# lido em várias threads. Em todos, só as colunas resolvidas no cabeçalho
+# são lidas e os passos depois da leitura são os do pandas (to_numeric com
+# coerce, parse_currency no custo em texto, dropna de lat/lon), então o
+# DataFrame sai igual ao do load_city(chunksize=None), inclusive a mediana
+# exata que preenche os custos ausentes.
+
+BACKENDS = ('pandas', 'parallel', 'arrow', 'polars')
+# na_values padrão do pd.read_csv: os outros backends tratam os mesmos textos como ausentes
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+             '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+
+def _optional(module: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError as err:
+        package = module.split('.')[0]
+        raise ImportError(f"o backend '{package}' precisa do pacote {package} (pip install {package})") from err
+
+
+def _from_columns(lat, lon, cost_txt, cost_num, nome, decimal: str | None = None,
+                  plan: dict | None = None) -> pd.DataFrame:
+    """
+    Parte comum dos backends. lat/lon: float64 com NaN; cost_num: custo já
+    em float (ex.: todos os textos eram números e o pandas inferiria coluna
+    numérica), senão None e cost_txt (custo como texto) passa pelo
+    parse_currency; os dois None = sem coluna de custo.
+    nome: textos (ausente já como 'nan', igual ao astype(str)) ou None
+    decimal: separador decimal do arquivo (sniff_columns)
+    plan: plano da validação das coordenadas (validate.plan_coordinates),
+    aplicado antes da mediana; None = coordenadas já validadas
+    """
+    n = len(lat)
+    if cost_num is not None:
+        custo = cost_num
+    elif cost_txt is not None:
+        custo = parse_currency(cost_txt, decimal).to_numpy()
+    else:
+        custo = np.full(n, np.nan)
+    if nome is None:
+        nome = np.array([f"Ponto {i}" for i in range(n)], dtype=object)
+    keep = ~(np.isnan(lat) | np.isnan(lon))
+    checks = None
+    if plan is not None:
+        with profiling.stage('validate'):
+            valid, checks = validate.apply_plan(lat[keep], lon[keep], plan)
+        keep[keep] = valid
+        if plan['eixos_trocados']:
+            lat, lon = lon, lat
+    custo = custo[keep]
+    # mediana em float64, antes de reduzir para float32 (a mesma do caminho pandas)
+    med = float(np.nanmedian(custo)) if (~np.isnan(custo)).any() else None
+    out = pd.DataFrame({
+        'lat': lat[keep].astype(np.float32),
+        'lon': lon[keep].astype(np.float32),
+        'custo': custo.astype(np.float32),
+        'nome': np.asarray(nome, dtype=object)[keep],
+    })
+    if checks is not None:
+        out.attrs['coord_checks'] = checks
+    return fill_missing_cost(out, med)
+
+
+def _parse_range(path, start: int, end: int, first_row: int, names: list, cols: dict) -> tuple:
+    """
+    Lê, normaliza e valida uma faixa de bytes do CSV (roda num processo do
+    pool). Devolve as colunas e as contagens da validação
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        buf = f.read(end - start)
+    try:
+        df = pd.read_csv(io.BytesIO(buf), header=None, names=names, **projection(cols, typed=True))
+    except ValueError:
+        df = pd.read_csv(io.BytesIO(buf), header=None, names=names, **projection(cols, typed=False))
+    out = validate.clean_frame(normalize_frame(df, cols, first_row), plan=cols['coords'])
+    return (out['lat'].to_numpy(np.float64), out['lon'].to_numpy(np.float64),
+            out['custo'].to_numpy(np.float64), out['nome'].to_numpy(object),
+            out.attrs['coord_checks'])
+
+
+def read_city_parallel(path, cols: dict | None = None, workers: int | None = None) -> pd.DataFrame:
+    """
+    Mesmo resultado do load_city(chunksize=None), com o arquivo dividido em
+    faixas de bytes alinhadas em fim de registro (aspas respeitadas) e cada
+    faixa lida num processo. workers: None = número de CPUs
+    """
+    if cols is None:
+        cols = sniff_columns(path)
+    names = list(pd.read_csv(path, nrows=0).columns)
+    workers = workers or os.cpu_count() or 1
+    if multiprocessing.parent_process() is not None:
+        # já num processo do pool do build_cities: não abre outro pool dentro
+        workers = 1
+    with profiling.stage('csv_split'):
+        ranges = csvsplit.split_ranges(path, workers)
+    job = partial(_parse_range, path, names=names, cols=cols)
+    with profiling.stage('csv_parse'):
+        if workers <= 1 or len(ranges) <= 1:
+            parts = [job(*r) for r in ranges]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+                # map mantém a ordem das faixas
+                parts = list(pool.map(job, *zip(*ranges)))
+
+    with profiling.stage('standardize'):
+        if not parts:
+            return _from_columns(np.empty(0), np.empty(0), None, None, np.empty(0, object), plan=cols['coords'])
+        lat, lon, custo, nome = (np.concatenate(col) for col in list(zip(*parts))[:4])
+        checks = None
+        for part in parts:
+            checks = validate.add_counts(checks, part[4])
+        # as faixas já vêm validadas, sem linhas vazias e com o custo convertido;
+        # com a coluna inteira em mãos a mediana exata sai de graça
+        out = _from_columns(lat, lon, None, custo, nome)
+        out.attrs['coord_checks'] = checks
+        return out
+
+
+def _arrow_short_rows(path, pa_csv, parse_options, convert_options):
+    """
+    Linhas com menos campos que o cabeçalho (ex.: arquivo truncado), já
+    completadas com nulos como faz o pd.read_csv: (posições, tabela).
+    Com várias threads o arrow não informa a posição da linha, então o
+    arquivo é relido numa thread só (acontece só em arquivo com linha curta)
+    """
+    bad = []
+
+    def collect(row):
+        # row.number conta registros com o cabeçalho (1) e sem linhas em branco
+        bad.append((row.number - 2, row.text + ',' * (row.expected_columns - row.actual_columns)))
+        return 'skip'
+
+    pa_csv.read_csv(
+        path,
+        read_options = pa_csv.ReadOptions(use_threads=False),
+        parse_options = pa_csv.ParseOptions(newlines_in_values=True, invalid_row_handler=collect),
+        convert_options = pa_csv.ConvertOptions(include_columns=[]),
+    )
+    names = list(pd.read_csv(path, nrows=0).columns)
+    fixed = pa_csv.read_csv(
+        io.BytesIO('\n'.join(text for _, text in bad).encode('utf-8')),
+        read_options = pa_csv.ReadOptions(column_names=names),
+        parse_options = parse_options,
+        convert_options = convert_options,
+    )
+    return np.array([pos for pos, _ in bad], dtype=np.int64), fixed
+
+
+def _read_arrow(path, cols: dict) -> pd.DataFrame:
+    pa = _optional('pyarrow')
+    pa_csv = _optional('pyarrow.csv')
+    usecols = projection(cols)['usecols']
+    short = []
+
+    def invalid_row(row):
+        # linha longa: o pd.read_csv também falha
+        if row.actual_columns > row.expected_columns:
+            return 'error'
+        short.append(row.actual_columns)
+        return 'skip'
+
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True, invalid_row_handler=invalid_row)
+    # tudo como texto: a coerção fica igual à do pandas, coluna a coluna
+    convert_options = pa_csv.ConvertOptions(
+        include_columns = usecols,
+        column_types = {c: pa.string() for c in usecols},
+        null_values = NA_VALUES,
+        strings_can_be_null = True,
+    )
+    with profiling.stage('csv_parse'):
+        table = pa_csv.read_csv(path, read_options=pa_csv.ReadOptions(use_threads=True),
+                                parse_options=parse_options, convert_options=convert_options)
+        if short:
+            # linha curta (arquivo truncado): o pandas completa os campos que
+            # faltam com NaN e a linha fica se ainda tiver lat/lon. O arrow só
+            # sabe pular: as linhas puladas voltam completadas, na mesma posição
+            pos, fixed = _arrow_short_rows(path, pa_csv, pa_csv.ParseOptions(newlines_in_values=True),
+                                           convert_options)
+            n = table.num_rows + fixed.num_rows
+            take = np.empty(n, dtype=np.int64)
+            is_fixed = np.zeros(n, bool)
+            is_fixed[pos] = True
+            take[~is_fixed] = np.arange(table.num_rows)
+            take[pos] = table.num_rows + np.arange(fixed.num_rows)
+            table = pa.concat_tables([table, fixed]).take(take)
+
+    def as_float(name):
+        # cast do arrow falha em qualquer texto inválido: aí cai no to_numeric
+        try:
+            return table[name].cast(pa.float64()).to_numpy()
+        except pa.ArrowInvalid:
+            return None
+
+    with profiling.stage('standardize'):
+        lat, lon = (as_float(cols[k]) for k in ('lat', 'lon'))
+        if lat is None:
+            lat = pd.to_numeric(table[cols['lat']].to_pandas(), errors='coerce').to_numpy(float)
+        if lon is None:
+            lon = pd.to_numeric(table[cols['lon']].to_pandas(), errors='coerce').to_numpy(float)
+        cost_txt = cost_num = nome = None
+        if cols['custo'] is not None:
+            cost_txt = table[cols['custo']].to_numpy(zero_copy_only=False)
+            cost_num = as_float(cols['custo'])
+        if cols['nome'] is not None:
+            nome = table[cols['nome']].fill_null('nan').to_numpy(zero_copy_only=False)
+        return _from_columns(lat, lon, cost_txt, cost_num, nome, cols.get('decimal'), plan=cols['coords'])
+
+
+def _read_polars(path, cols: dict) -> pd.DataFrame:
+    pl = _optional('polars')
+    exprs = [pl.col(cols[k]).cast(pl.Float64, strict=False).alias(k) for k in ('lat', 'lon')]
+    if cols['custo'] is not None:
+        exprs += [pl.col(cols['custo']).alias('custo_txt'),
+                  pl.col(cols['custo']).cast(pl.Float64, strict=False).alias('custo_num')]
+    if cols['nome'] is not None:
+        exprs.append(pl.col(cols['nome']).fill_null('nan').alias('nome'))
+    with profiling.stage('csv_parse'):
+        # scan preguiçoso: só as colunas usadas são lidas, em todas as threads do polars
+        df = pl.scan_csv(path, infer_schema=False, null_values=NA_VALUES).select(exprs).collect()
+
+    with profiling.stage('standardize'):
+        cost_txt = cost_num = nome = None
+        if cols['custo'] is not None:
+            cost_txt = df['custo_txt'].to_numpy()
+            # algum texto que não é número: a coluna é de moeda ("$1,234.00")
+            if df['custo_num'].null_count() == df['custo_txt'].null_count():
+                cost_num = df['custo_num'].to_numpy()
+        if cols['nome'] is not None:
+            nome = df['nome'].to_numpy()
+        return _from_columns(df['lat'].to_numpy(), df['lon'].to_numpy(), cost_txt, cost_num, nome,
+                             cols.get('decimal'), plan=cols['coords'])
+
+
+def read_city_backend(path, cols: dict | None = None, backend: str = 'arrow') -> pd.DataFrame:
+    """
+    Mesmo resultado do load_city, lendo o CSV em faixas paralelas
+    ('parallel'), com pyarrow ('arrow') ou polars ('polars'). Os pacotes
+    do arrow/polars são opcionais: só precisam estar instalados para quem
+    escolher o backend.
+    """
+    if cols is None:
+        cols = sniff_columns(path)
+    if backend == 'parallel':
+        return read_city_parallel(path, cols)
+    if backend == 'arrow':
+        return _read_arrow(path, cols)
+    if backend == 'polars':
+        return _read_polars(path, cols)
+    raise ValueError(f'backend desconhecido: {backend} (opções: {", ".join(BACKENDS)})')
+
+
 def city_center(df:pd.DataFrame) -> dict:
+    # df pode ser um DataFrame ou um store.CityStore (arrays float32 mapeados)
     return dict(
-        lat = float(df['lat'].mean()),
-        lon = float(df['lon'].mean()),
+        lat = float(np.asarray(df['lat']).mean(dtype=np.float64)),
+        lon = float(np.asarray(df['lon']).mean(dtype=np.float64)),
     )
 
 #----------------------TRACES---------------------------
 
-def make_point_trace(df: pd.DataFrame, name:str) -> go.Scattermapbox:
-    hover = ("<b>%{customdata[0]}</b><br>"
-             "Custo: %{customdata[1]}<br>"
+def make_point_trace(df: pd.DataFrame, name:str, idx: np.ndarray | None = None,
+                     cost_scale: dict | None = None) -> go.Scattermapbox:
+    """
+    idx: só esses pontos entram no trace (ex.: subconjunto do lod).
+    cost_scale: faixas de quantil do custo da cidade (scale.compute_scale);
+    None usa a escala gravada no store ou calcula na hora
+    """
+    hover = ("<b>%{text}</b><br>"
+             "Custo: %{customdata:.2f}<br>"
              "Lat:%{lat:.5f} - lon:%{lon:.5f}"
              )
-    # tamanho dos marcadores (normalidade pelo custos)
-    c = df["custo"].astype(float).values
-    c_min, c_max = float(np.min(c)), float(np.max(c))
-
-    #Caso Especial: se não existirem valores numericos ou se todos os custos forem praticamente iguais (diferença menor que 1e-9) cria um array de tamanhos fixos 10 para todos os pontos.
-
-    if not np.isfinite(c_min) or not np.isfinite(c_max) or abs(c_max - c_min) < 1e-9:
-        size = np.full_like(c,10.0, dtype=float)
-    else: 
-    
-    # Saso normal: normaliza os custos para o intervalo[0,1] e escala para variar entre 6 e 26 (20 de amplitude mais deslocamento de 6) pontos de custo baixo ~6, pontos de custo alto ~26
-        size = (c-c_min) / (c_max - c_min) *20 + 6
-        #mesmo que os dados estejam fora da faixa de 6,26, ele evita a sua apresentação, forçando a ficar entre o intervalo. 
-        sizes = np.clip(size,6,26)
-
-        custom = np.stack([df['nome'].values, df['custo'].values],axis=1)
-        return go.Scattermapbox(
-            lat = df['lat'],
-            lon = df['lon'],
-            mode = 'markers',
-            marker = dict(
-                size = sizes,
-                color = df['custo'],
-                colorscale = "Viridis",
-                colorbar = dict(title='custo')
-                ),
-            name = f"{name} - Pontos",
-            hovertemplate = custom,
-            customdata = "Nome: %{customdata[0]}<br>Custo: %{customdata[1]}"
-        )
+    # np.asarray não copia: lê direto da Series ou do memmap do store
+    lat = np.asarray(df['lat'])
+    lon = np.asarray(df['lon'])
+    c = np.asarray(df['custo'])
+    nome = df['nome']
+    if idx is not None:
+        lat, lon, c = lat[idx], lon[idx], c[idx]
+        # NameBuffer do store decodifica só os nomes escolhidos
+        nome = nome.iloc[idx] if isinstance(nome, pd.Series) else nome[idx]
+
+    # tamanho e cor pela faixa de quantil do custo (um searchsorted só):
+    # um anúncio muito caro fica na última faixa sem achatar os outros
+    if cost_scale is None:
+        cost_scale = df.scale if isinstance(df, store.CityStore) else scale.compute_scale(df['custo'])
+    bins = scale.bin_index(cost_scale, c)
+    sizes = scale.sizes_for(cost_scale, bins)
+
+    # hover sem matriz de objetos: nome em text e custo float32 em customdata
+    # (1-D, vai em binário com --binary e serve de z para o calor compartilhado)
+    with profiling.stage('hover_data'):
+        text = np.asarray(nome, dtype=object)
+        custom = np.asarray(c, dtype=np.float32)
+    return go.Scattermapbox(
+        lat = lat,
+        lon = lon,
+        mode = 'markers',
+        marker = dict(
+            size = sizes,
+            color = bins,
+            cmin = 0,
+            cmax = scale.n_bins(cost_scale) - 1,
+            colorscale = "Viridis",
+            colorbar = scale.colorbar_for(cost_scale)
+            ),
+        name = f"{name} - Pontos",
+        hovertemplate = hover,
+        text = text,
+        customdata = custom
+    )
         
-def make_density_trace(df: pd.DataFrame, name: str) -> go.Densitymap: return go.Densitymapbox(
-                lat = df['lat'],
-                long = df['lon'],
-                z = df['custo'],
-                radius = 20,
+def make_cluster_trace(pyramid: clusters.ClusterPyramid, zoom: float, name: str, bbox=None) -> go.Scattermapbox:
+    """
+    Bolhas de cluster do zoom dado (clusters.ClusterPyramid): tamanho pelo
+    número de anúncios (log) e cor pelo custo médio do cluster
+    """
+    sel = pyramid.at(zoom, bbox)
+    count = pyramid.count[sel]
+    custom = np.stack([count, pyramid.median[sel]], axis=1)
+    return go.Scattermapbox(
+        lat = pyramid.lat[sel],
+        lon = pyramid.lon[sel],
+        mode = 'markers',
+        marker = dict(
+            size = np.clip(8 + 6 * np.log10(np.maximum(count, 1)), 8, 40),
+            color = pyramid.mean[sel],
+            colorscale = "Viridis",
+            colorbar = dict(title='custo médio')
+            ),
+        name = f"{name} - Clusters",
+        hovertemplate = ("<b>%{customdata[0]} anúncios</b><br>"
+                         "Custo médio: %{marker.color:.2f}<br>"
+                         "Mediana: %{customdata[1]:.2f}"),
+        customdata = custom
+    )
+
+
+def make_density_trace(df: pd.DataFrame, name: str, shared: bool = False,
+                       grid_bins: int | None = None, zoom: float = 10, smooth: float = 1.0,
+                       kde: bool = False) -> go.Densitymap:
+    """
+    shared=True não embute lat/lon/z no trace: no html o navegador reaproveita
+    os arrays do trace de pontos da mesma cidade (ver SHARE_DATA_JS), então
+    cada cidade é serializada uma vez só.
+    grid_bins=N agrega os anúncios no servidor numa grade N x N (custo somado
+    por célula) e manda só os centros das células ocupadas.
+    kde=True calcula a densidade ponderada pelo custo por FFT (density.kde_grid)
+    com banda adaptada à cidade. Em todos os modos o raio vem dos dados
+    (banda da cidade ou tamanho da célula) no zoom da cidade
+    """
+    if kde:
+        if len(df['lat']):
+            grid = density.kde_grid(df['lat'], df['lon'], df['custo'], bins=grid_bins or density.KDE_BINS)
+            lat, lon, z = density.grid_points(grid)
+            # a superfície já vem suavizada: o raio só preenche a célula
+            radius = density.cell_radius_px(grid, zoom, cells=1.0)
+        else:
+            # cidade sem nenhuma linha válida: não há superfície para calcular
+            lat = lon = z = np.empty(0, np.float32)
+            radius = 10
+    elif grid_bins:
+        if len(df['lat']):
+            grid = density.grid_density(df['lat'], df['lon'], df['custo'], bins=grid_bins, smooth=smooth)
+            lat, lon, z = density.grid_points(grid)
+            radius = density.cell_radius_px(grid, zoom)
+        else:
+            # cidade sem nenhuma linha válida: não há grade para montar
+            lat = lon = z = np.empty(0, np.float32)
+            radius = 10
+    else:
+        radius = density.bandwidth_radius_px(df['lat'], df['lon'], zoom)
+        if shared:
+            lat = lon = z = []
+        else:
+            lat, lon, z = np.asarray(df['lat']), np.asarray(df['lon']), np.asarray(df['custo'])
+    return go.Densitymapbox(
+                lat = lat,
+                lon = lon,
+                z = z,
+                radius = radius,
                 colorscale = 'inferno',
-                name = f"{name} - Pontos",
+                name = f"{name} - Calor",
                  showscale = True,
                 colorbar = dict(title = 'Densidade')
     )
 
-def main():
-    ny = standartize_columns(pd.read_csv(f"{folder}{t_ny}"))
-    rj = standartize_columns(pd.read_csv(f"{folder}{t_rj}"))
 
-    ny_point = make_point_trace(ny, 'Nova York')
-    ny_heat = make_point_trace(ny, 'Nova York')
-    rj_point = make_point_trace(rj, 'Rio de Janeiro')
-    rj_heat = make_point_trace(rj, 'Rio de Janeiro')
+# roda no navegador logo após o Plotly.newPlot: todo trace com meta.data_from
+# passa a apontar para os mesmos arrays lat/lon/custo do trace de pontos
+# (referência JS, sem cópia e sem duplicar os números no html)
+SHARE_DATA_JS = """
+var gd = document.getElementById('{plot_id}');
+var update = {lat: [], lon: [], z: []}, idx = [];
+gd.data.forEach(function (t, i) {
+    if (t.meta && t.meta.data_from !== undefined) {
+        var src = gd.data[t.meta.data_from];
+        update.lat.push(src.lat);
+        update.lon.push(src.lon);
+        // marker.color guarda a faixa do custo; o custo em si está em customdata
+        update.z.push(src.customdata);
+        idx.push(i);
+    }
+});
+if (idx.length) { Plotly.restyle(gd, update, idx); }
+"""
+
+#----------------------PIPELINE POR CIDADE---------------------------
+
+def build_city(city: dict, folder: str = folder, point_budget: int | None = None,
+               grid_bins: int | None = None, kde: bool = False, cache_dir: str | None = None,
+               profile: bool = False, profile_memory: bool = True, backend: str = 'pandas') -> dict:
+    """
+    Pipeline completo de uma cidade do cadastro (leitura/cache, padronização e traces).
+    Roda em processo separado no modo --workers, por isso devolve só dados
+    simples (traces já em dict) que podem ser enviados de volta ao processo pai.
+    point_budget: máximo de pontos no trace de pontos (o calor sempre usa todos)
+    grid_bins: calor agregado numa grade N x N em vez de um ponto por anúncio
+    kde: calor por KDE via FFT (grid_bins vira a resolução da grade fina)
+    cache_dir: pasta de cache compartilhada por todas as cidades (None = <pasta dos dados>/.cache)
+    profile: mede as etapas (profiling) e devolve os registros em 'profile'
+    profile_memory: False mede só tempos (sem o tracemalloc, que infla os tempos)
+    backend: leitor do CSV quando o cache está vencido ('pandas', 'arrow' ou 'polars')
+    """
+    # no mesmo processo do main o profiler dele já está ativo; num processo
+    # do pool é criado um novo e os registros voltam no resultado
+    prof = profiling.active() if profile else None
+    own = profiling.Profiler(memory=profile_memory) if profile and prof is None else None
+    with profiling.activate(own or prof), profiling.stage('build_city', city['label']):
+        # cache em colunas .npy: só relê o CSV quando o arquivo mudar.
+        # o store abre as colunas float32 mapeadas em memória, sem copiar
+        with profiling.stage('load'):
+            data = open_city(city, folder, cache_dir, backend)
+            zoom = cities.city_zoom(city, data)
+        if point_budget is not None and len(data) > point_budget:
+            # pontos reduzidos pelo lod: o calor precisa dos próprios arrays completos
+            with profiling.stage('lod'):
+                # html estático: completa o orçamento, não só os representantes do zoom inicial
+                idx = lod.LodIndex(data['lat'], data['lon'], data['custo']).fill(point_budget)
+            with profiling.stage('point_trace'):
+                point = make_point_trace(data, city['label'], idx=np.sort(idx))
+        else:
+            with profiling.stage('point_trace'):
+                point = make_point_trace(data, city['label'])
+        # sem lod e sem grade o calor reaproveita os arrays do trace de pontos
+        shared = not grid_bins and not kde and (point_budget is None or len(data) <= point_budget)
+        with profiling.stage('density_trace'):
+            heat = make_density_trace(data, city['label'], shared=shared, grid_bins=grid_bins, zoom=zoom, kde=kde)
+        with profiling.stage('to_plotly_json'):
+            traces = [point.to_plotly_json(), heat.to_plotly_json()]
+        result = dict(
+            label = city['label'],
+            zoom = zoom,
+            center = city_center(data),
+            traces = traces,
+            shared = shared,
+            coord_checks = data.meta.get('coord_checks'),
+        )
+    if own is not None:
+        result['profile'] = own.records
+    return result
 
-    fig = go.Figure([ny_point, ny_heat, rj_point, rj_heat])
 
-    fig.data[1].visible = False
-    fig.data[2].visible = False
-    fig.data[3].visible = False
-       
-    def update_map_layout(df, zoom):
-        return {
-            "mapbox.center":city_center (df),
-            "mapbox.zoom":zoom
-        }
+# aumentar quando build_city mudar o formato dos traces (invalida os resultados salvos)
+BUILD_VERSION = 2
 
-        fig = go.Figure(center = city_center(df), zoom=zoom)
 
-    buttons = [
-        dict(
-            label = "Nova York - Pontos",
-            method = "update",
-            args = [
-                {"visible":[True, False, False, False]},
-                {update_map_layout(ny, 9)}
-            ]
-        ),
-        dict(
-            label = "Nova York - Calor",
-            method = "update",
-            args = [
-                {"visible":[False, True, False, False]},
-                {update_map_layout(ny, 9)}
-            ]
-        ),
-        dict(
-            label = "Rio de Janeiro - Pontos",
-            method = "update",
-            args = [
-                {"visible":[False, False, True, False]},
-                {update_map_layout (rj, 10)}
-            ]
-        ),
-        
-        dict(
-            label = "Rio de Janeiro - Calor",
-            method = "update",
-            args = [
-                {"visible":[False, False, False, True]},
-                {update_map_layout(rj, 10)}
-            ]
-        )
-    ]
+def artifact_path(city: dict, folder: str = folder, **opts) -> str | None:
+    """
+    Onde fica o resultado salvo do build_city desta cidade para a versão atual
+    do arquivo de origem e destas opções. None se o cache dos dados estiver
+    vencido (arquivo novo/alterado): aí a cidade precisa ser refeita.
+    """
+    src = os.path.join(folder, city['file'])
+    entry = cache.entry_dir(src, opts.get('cache_dir'))
+    meta = cache.read_meta(entry)
+    if not os.path.exists(src) or not cache.is_fresh(src, meta):
+        return None
+    # opções que não mudam o resultado ficam fora da chave
+    key_opts = {k: v for k, v in opts.items() if k not in ('cache_dir', 'profile', 'profile_memory', 'backend')}
+    # versão do cache também entra: mudança na normalização muda os dados da cidade
+    key = json.dumps([BUILD_VERSION, cache.CACHE_VERSION, meta['source']['hash'], city, key_opts],
+                     sort_keys=True, default=str)
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+    return os.path.join(entry, f"build-{digest}.pkl")
+
+
+def _save_artifact(path: str, result: dict):
+    # o perfil é da execução que gerou o resultado, não do resultado
+    result = {k: v for k, v in result.items() if k != 'profile'}
+    # só um resultado por cidade: apaga os de versões/opções anteriores
+    for old in glob.glob(os.path.join(os.path.dirname(path), 'build-*.pkl')):
+        if old != path:
+            os.remove(old)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def build_cities(city_list: list, folder: str = folder, workers: int = 1, incremental: bool = True, **opts) -> list:
+    """
+    Roda build_city para todas as cidades; workers > 1 usa um pool de processos.
+    incremental=True reaproveita o resultado salvo de cada cidade cujo arquivo
+    e opções não mudaram; só as outras são refeitas (e vão para o pool).
+    Cada resultado ganha 'reused' (True se veio do disco) e 'key'.
+    opts: mesmos argumentos nomeados do build_city
+    """
+    results = [None] * len(city_list)
+    todo = []
+    for i, city in enumerate(city_list):
+        path = artifact_path(city, folder, **opts) if incremental else None
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                results[i] = dict(pickle.load(f), reused = True)
+        else:
+            todo.append(i)
+
+    job = partial(build_city, folder=folder, **opts)
+    pending = [city_list[i] for i in todo]
+    if workers <= 1 or len(pending) <= 1:
+        built = [job(city) for city in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            # map mantém a ordem das cidades, então os botões saem na mesma ordem
+            built = list(pool.map(job, pending))
+
+    for i, r in zip(todo, built):
+        # depois do build o cache dos dados está em dia: já dá para calcular a chave
+        path = artifact_path(city_list[i], folder, **opts)
+        if path is not None:
+            r['key'] = os.path.basename(path)[len('build-'):-len('.pkl')]
+            _save_artifact(path, r)
+        results[i] = dict(r, reused = False)
+    for r in results:
+        r.setdefault('key', None)
+    return results
+
+
+def assemble_figure(results: list) -> go.Figure:
+    """Junta os traces de todas as cidades em uma figura com menu de seleção"""
+    traces = []
+    for r in results:
+        point, heat = r['traces']
+        if r['shared']:
+            # o calor usa os dados do trace de pontos (copiados no navegador)
+            heat['meta'] = dict(data_from = len(traces))
+        traces += [point, heat]
+    fig = go.Figure(traces)
+    for i, trace in enumerate(fig.data):
+        trace.visible = i == 0
+
+    def update_map_layout(center, zoom):
+        return {
+            "mapbox.center": center,
+            "mapbox.zoom": zoom
+        }
 
+    buttons = []
+    pos = 0
+    for r in results:
+        for kind in ('Pontos', 'Calor'):
+            visible = [False] * len(traces)
+            visible[pos] = True
+            buttons.append(dict(
+                label = f"{r['label']} - {kind}",
+                method = "update",
+                args = [
+                    {"visible": visible},
+                    update_map_layout(r['center'], r['zoom'])
+                ]
+            ))
+            pos += 1
+
+    first = results[0] if results else dict(center = dict(lat = 0, lon = 0), zoom = 1)
     fig.update_layout(
         title = "Mapa interativo de Custos - Pontos e Mapka de Calor ",
         mapbox_style = "open-street-map",
-        mapbox = dict(center=city_center(rj), zoom = 10),
+        mapbox = dict(center=first['center'], zoom = first['zoom']),
         margin = dict(l=10, r=10, t=50, b=10),
         updatemenus = [dict(
             buttons = buttons,
             direction = 'down',
             x = 0.01,
             y = 0.99,
-            yanchor = 'left',
-            xanchor = 'top',
+            yanchor = 'top',
+            xanchor = 'left',
             bgcolor = 'white',
             bordercolor = 'lightgray'
         )],
         legend = dict(
             orientation = 'h',
             yanchor = 'bottom',
-            xanchor = 'rigth',
+            xanchor = 'right',
             y = 0.5,
             x = 0.99
         ),
     )
+    return fig
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Gera o mapa interativo de custos AirBnB')
+    parser.add_argument('--folder', default=folder, help='pasta com os CSVs e onde o html é salvo')
+    parser.add_argument('--cities', default=cities.REGISTRY_FILE, help='cadastro de cidades (json)')
+    parser.add_argument('--cache-dir', default=None, help='pasta de cache compartilhada (padrão: <pasta>/.cache)')
+    parser.add_argument('--backend', choices=BACKENDS, default='pandas',
+                        help='leitor dos CSVs: pandas, parallel (faixas do arquivo em vários processos) '
+                             'ou, se instalados, arrow/polars (várias threads)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processos em paralelo (uma cidade por processo); 0 = número de CPUs')
+    parser.add_argument('--point-budget', type=int, default=None,
+                        help=f'máximo de pontos por cidade no modo pontos (sugestão: {lod.POINT_BUDGET}); o calor usa todos')
+    parser.add_argument('--density-grid', type=int, default=None, metavar='N',
+                        help=f'calor agregado no servidor numa grade N x N (sugestão: {density.GRID_BINS})')
+    parser.add_argument('--kde', action='store_true',
+                        help=f'calor por KDE via FFT com banda adaptada à cidade (grade --density-grid ou {density.KDE_BINS})')
+    parser.add_argument('--full', action='store_true',
+                        help='refaz todas as cidades, mesmo as que não mudaram')
+    parser.add_argument('--binary', action='store_true',
+                        help=f'grava lat/lon/custo como float32 em base64 (plotly.js >= {encoding.TYPED_ARRAY_MIN_PLOTLYJS})')
+    parser.add_argument('--lazy', action='store_true',
+                        help='dados de cada cidade em arquivo .json.gz separado, baixado ao escolher a cidade (servir por http)')
+    parser.add_argument('--compare-encoding', action='store_true',
+                        help='mostra tamanho e tempo de parse do html em JSON x binário')
+    parser.add_argument('--profile', nargs='?', const='perfil_mapa.json', default=None, metavar='JSON',
+                        help='mede tempo, CPU e pico de memória de cada etapa por cidade e grava o relatório '
+                             '(padrão: <pasta>/perfil_mapa.json)')
+    parser.add_argument('--profile-no-memory', dest='profile_memory', action='store_false',
+                        help='com --profile, mede só tempo e CPU: o tracemalloc deixa as etapas '
+                             'várias vezes mais lentas')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    prof = profiling.Profiler(memory=args.profile_memory) if args.profile else None
+    with profiling.activate(prof):
+        _run(args, prof)
+    if prof is not None:
+        out = os.path.join(args.folder, args.profile)
+        prof.save(out)
+        print(prof.summary())
+        print(f"perfil salvo em: {out}")
+
+
+def _run(args, prof: profiling.Profiler | None = None):
+    workers = args.workers or os.cpu_count() or 1
+    if args.binary and not encoding.supports_typed_arrays():
+        # plotly.js antigo não entende {dtype, bdata}: o mapa sairia vazio
+        print(f"aviso: --binary precisa do plotly.js >= {encoding.TYPED_ARRAY_MIN_PLOTLYJS} "
+              f"(instalado: {encoding.plotlyjs_version()}); gravando os arrays como listas")
+        args.binary = False
+
+    opts = dict(point_budget = args.point_budget, grid_bins = args.density_grid,
+                kde = args.kde, cache_dir = args.cache_dir)
+    if args.backend != 'pandas':
+        opts['backend'] = args.backend
+    if prof is not None:
+        opts['profile'] = True
+        opts['profile_memory'] = prof.memory
+    with profiling.stage('build_cities'):
+        results = build_cities(cities.load_registry(args.cities), args.folder, workers,
+                               incremental = not args.full, **opts)
+    for r in results:
+        # cidades medidas num processo do pool: junta no perfil geral
+        records = r.pop('profile', None)
+        if prof is not None and records:
+            prof.merge(records)
+    rebuilt = [r['label'] for r in results if not r['reused']]
+    print(f"cidades refeitas: {len(rebuilt)} de {len(results)} {rebuilt if rebuilt else ''}")
+    for r in results:
+        checks = validate.describe(r.get('coord_checks'))
+        if checks and not r['reused']:
+            print(f"  {r['label']}: coordenadas descartadas - {checks}")
+    with profiling.stage('assemble_figure'):
+        fig = assemble_figure(results)
 
 #salva como html de apresentação
-    fig.write_html(f"{folder}mapa_custos_interativos.html", include_plotlys = 'cdn', full_html = True)
-    print(f"arquivo gerado com sucesso em: {folder}mapa_custos_interativos.html")
+    out = os.path.join(args.folder, "mapa_custos_interativos.html")
+    with profiling.stage('write_html'):
+        if args.lazy:
+            files = export.write_lazy_html(fig, [r['label'] for r in results], out, binary = args.binary,
+                                           keys = [r['key'] for r in results], full_html = True)
+            print(f"{len(files)} arquivos de cidade em: {os.path.dirname(files[0]) if files else out}")
+        elif args.binary:
+            encoding.write_html(fig, out, include_plotlyjs = 'cdn', full_html = True, post_script = SHARE_DATA_JS)
+        else:
+            fig.write_html(out, include_plotlyjs = 'cdn', full_html = True, post_script = SHARE_DATA_JS)
+    if args.compare_encoding:
+        print(encoding.compare(fig))
+    print(f"arquivo gerado com sucesso em: {out}")
 
 #inicia o servidor:
 
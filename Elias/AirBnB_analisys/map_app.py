@@ -0,0 +1,147 @@
+import argparse
+
+import numpy as np
+import plotly.graph_objs as go
+from dash import Dash, html, dcc, Input, Output
+
+import cities
+import clusters
+import density
+import lod
+import main
+import spatial
+
+#-----------------------------------------------------------------
+# ---------------SERVIDOR DASH GUIADO PELO VIEWPORT----------------
+#-----------------------------------------------------------------
+# Em vez de um html com todos os anúncios, a página abre vazia e cada
+# pan/zoom manda o viewport para o servidor, que responde só com o que
+# aparece na tela: pontos escolhidos pelo lod (até POINT_BUDGET), as
+# células de calor agregadas dentro do retângulo visível ou as bolhas de
+# cluster pré-calculadas do zoom atual.
+
+HEAT_BINS = 128
+# tamanho aproximado do gráfico, usado quando o plotly ainda não mandou os cantos
+GRAPH_PX = (1200, 700)
+
+
+def load_cities(folder: str = main.folder, registry: str = cities.REGISTRY_FILE, cache_dir: str | None = None) -> dict:
+    """Abre store, índice espacial, lod e clusters de cada cidade uma vez, na subida do servidor"""
+    loaded = {}
+    for city in cities.load_registry(registry):
+        data = main.open_city(city, folder, cache_dir)
+        city = dict(city, zoom = cities.city_zoom(city, data))
+        loaded[city['label']] = dict(
+            city = city,
+            data = data,
+            index = spatial.open_index(data),
+            lod = lod.LodIndex(data['lat'], data['lon'], data['custo']),
+            clusters = clusters.ClusterPyramid(data['lat'], data['lon'], data['custo']),
+            center = main.city_center(data),
+        )
+    return loaded
+
+
+def viewport(relayout: dict | None, center: dict, zoom: float) -> tuple:
+    """
+    (lat_min, lon_min, lat_max, lon_max) visível. Usa os cantos que o plotly
+    manda em mapbox._derived; sem eles estima pelo centro, zoom e GRAPH_PX.
+    """
+    relayout = relayout or {}
+    corners = (relayout.get('mapbox._derived') or {}).get('coordinates')
+    if corners:
+        lons = [c[0] for c in corners]
+        lats = [c[1] for c in corners]
+        return min(lats), min(lons), max(lats), max(lons)
+    deg_per_px = 360.0 / (256 * 2 ** zoom)
+    half_lon = GRAPH_PX[0] / 2 * deg_per_px
+    half_lat = GRAPH_PX[1] / 2 * deg_per_px * np.cos(np.radians(center['lat']))
+    return (center['lat'] - half_lat, center['lon'] - half_lon,
+            center['lat'] + half_lat, center['lon'] + half_lon)
+
+
+def view_figure(c: dict, mode: str, relayout: dict | None, budget: int = lod.POINT_BUDGET) -> go.Figure:
+    """Figura com só o que está no viewport atual da cidade c"""
+    relayout = relayout or {}
+    center = relayout.get('mapbox.center') or c['center']
+    zoom = float(relayout.get('mapbox.zoom') or c['city']['zoom'])
+    bbox = viewport(relayout, center, zoom)
+    data = c['data']
+    idx = c['index'].bbox_query(*bbox)
+
+    if mode == 'Calor':
+        if len(idx):
+            grid = density.grid_density(data['lat'][idx], data['lon'][idx], data['custo'][idx],
+                                        bins=HEAT_BINS, bbox=bbox, smooth=1.0)
+            lat, lon, z = density.grid_points(grid)
+            radius = density.cell_radius_px(grid, zoom)
+        else:
+            lat = lon = z = np.empty(0, np.float32)
+            radius = 10
+        trace = go.Densitymapbox(lat=lat, lon=lon, z=z, radius=radius, colorscale='inferno',
+                                 name=f"{c['city']['label']} - Calor", colorbar=dict(title='Densidade'))
+    elif mode == 'Clusters':
+        trace = main.make_cluster_trace(c['clusters'], zoom, c['city']['label'], bbox)
+    else:
+        idx = c['lod'].select(idx, zoom, budget)
+        trace = main.make_point_trace(data, c['city']['label'], idx=idx)
+
+    fig = go.Figure([trace])
+    fig.update_layout(
+        mapbox_style = "open-street-map",
+        mapbox = dict(center=center, zoom=zoom),
+        margin = dict(l=10, r=10, t=10, b=10),
+        # mesma uirevision: o plotly mantém o viewport do usuário entre updates
+        uirevision = c['city']['label'],
+    )
+    return fig
+
+
+def create_app(cities: dict, budget: int = lod.POINT_BUDGET) -> Dash:
+    app = Dash(__name__)
+    labels = list(cities)
+    app.layout = html.Div([
+        html.H3("Mapa interativo de Custos"),
+        html.Div([
+            dcc.Dropdown(id='cidade', options=labels, value=labels[0] if labels else None, clearable=False,
+                         style=dict(width='300px')),
+            dcc.RadioItems(id='modo', options=['Pontos', 'Calor', 'Clusters'], value='Pontos', inline=True),
+        ], style=dict(display='flex', gap='20px', alignItems='center')),
+        dcc.Graph(id='mapa', style=dict(height='85vh')),
+    ])
+
+    @app.callback(
+        Output('mapa', 'figure'),
+        Input('cidade', 'value'),
+        Input('modo', 'value'),
+        Input('mapa', 'relayoutData'),
+    )
+    def update_map(label, mode, relayout):
+        c = cities[label]
+        # relayoutData da cidade anterior não vale para a nova: recentra
+        if relayout and relayout.get('mapbox.center'):
+            center = relayout['mapbox.center']
+            lat_min, lon_min, lat_max, lon_max = c['index'].bbox
+            if not (lat_min <= center['lat'] <= lat_max and lon_min <= center['lon'] <= lon_max):
+                relayout = None
+        return view_figure(c, mode, relayout, budget)
+
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor Dash do mapa de custos AirBnB')
+    parser.add_argument('--folder', default=main.folder, help='pasta com os CSVs')
+    parser.add_argument('--cities', default=cities.REGISTRY_FILE, help='cadastro de cidades (json)')
+    parser.add_argument('--cache-dir', default=None, help='pasta de cache compartilhada')
+    parser.add_argument('--point-budget', type=int, default=lod.POINT_BUDGET,
+                        help='máximo de pontos enviados por resposta')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--debug', action='store_true')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    app = create_app(load_cities(args.folder, args.cities, args.cache_dir), args.point_budget)
+    app.run(debug=args.debug, port=args.port)
@@ -0,0 +1,148 @@
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+
+#-----------------------------------------------------------------
+# ---------------PERFIL DAS ETAPAS DO PIPELINE---------------------
+#-----------------------------------------------------------------
+# Mede tempo de relógio, tempo de CPU e pico de memória (tracemalloc) de
+# cada etapa, por cidade. As funções do pipeline marcam as etapas com
+#
+#   with profiling.stage('csv_parse'):
+#       ...
+#
+# e só pagam o custo quando há um Profiler ativo (profiling.activate);
+# sem ele stage() devolve sempre o mesmo contexto vazio.
+# Com memory=True os tempos incluem o custo do tracemalloc, que deixa o
+# código python várias vezes mais lento (o pandas bem mais que o numpy):
+# para comparar tempos use memory=False (main.py --profile-no-memory).
+# Etapas podem ser aninhadas: a de dentro herda a cidade da de fora e o
+# tempo dela também conta na de fora. Chamadas repetidas da mesma etapa
+# (ex.: um bloco do CSV por vez) são somadas numa linha só.
+
+_NULL = contextlib.nullcontext()
+_active = None
+
+
+class Profiler:
+
+    def __init__(self, memory: bool = True):
+        # memory=False mede só os tempos (tracemalloc deixa o código mais lento)
+        self.memory = memory
+        self._stats = {}
+        self._open = []
+        self._tracing = False
+        # processos do pool criados por fork herdam uma cópia do profiler do pai
+        self.pid = os.getpid()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, city: str | None = None):
+        if city is None and self._open:
+            city = self._open[-1]['city']
+        frame = self._enter(city)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak = self._exit(frame)
+            self._add(dict(city = city, stage = name, calls = 1, wall_s = wall, cpu_s = cpu, peak_mb = peak))
+
+    def _bump(self):
+        # o pico do tracemalloc é global: repassa para todas as etapas abertas e zera
+        peak = tracemalloc.get_traced_memory()[1]
+        for f in self._open:
+            f['peak'] = max(f['peak'], peak)
+        tracemalloc.reset_peak()
+
+    def _enter(self, city) -> dict:
+        frame = dict(city = city, base = 0, peak = 0)
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            self._bump()
+            frame['base'] = frame['peak'] = tracemalloc.get_traced_memory()[0]
+        self._open.append(frame)
+        return frame
+
+    def _exit(self, frame) -> float:
+        if self.memory:
+            self._bump()
+        self._open.remove(frame)
+        if self._tracing and not self._open:
+            tracemalloc.stop()
+            self._tracing = False
+        return (frame['peak'] - frame['base']) / 2**20
+
+    def _add(self, rec: dict):
+        key = (rec['city'], rec['stage'])
+        cur = self._stats.get(key)
+        if cur is None:
+            self._stats[key] = dict(rec)
+        else:
+            cur['calls'] += rec['calls']
+            cur['wall_s'] += rec['wall_s']
+            cur['cpu_s'] += rec['cpu_s']
+            cur['peak_mb'] = max(cur['peak_mb'], rec['peak_mb'])
+
+    @property
+    def records(self) -> list:
+        return [dict(r) for r in self._stats.values()]
+
+    def merge(self, records: list):
+        """Soma registros vindos de outro Profiler (ex.: de um processo do pool)"""
+        for rec in records:
+            self._add(rec)
+
+    def report(self) -> dict:
+        rows = [dict(r, wall_s = round(r['wall_s'], 4), cpu_s = round(r['cpu_s'], 4),
+                     peak_mb = round(r['peak_mb'], 2)) for r in self._stats.values()]
+        return dict(memory = self.memory, stages = rows)
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+    def summary(self, limit: int = 20) -> str:
+        """Tabela de uma tela com as etapas mais lentas"""
+        rows = sorted(self._stats.values(), key=lambda r: r['wall_s'], reverse=True)
+        lines = [f"{'cidade':<18} {'etapa':<20} {'vezes':>5} {'relógio':>9} {'cpu':>9} {'pico mem':>10}"]
+        for r in rows[:limit]:
+            lines.append(f"{(r['city'] or '-')[:18]:<18} {r['stage'][:20]:<20} {r['calls']:>5} "
+                         f"{r['wall_s']:8.3f}s {r['cpu_s']:8.3f}s "
+                         + (f"{r['peak_mb']:7.1f} MB" if self.memory else f"{'-':>10}"))
+        if len(rows) > limit:
+            lines.append(f"... mais {len(rows) - limit} etapas no relatório json")
+        if self.memory:
+            lines.append("tempos com o tracemalloc ligado (mais lentos que o real); "
+                         "só tempos: --profile-no-memory")
+        return '\n'.join(lines)
+
+
+def active() -> Profiler | None:
+    """Profiler ativo neste processo (None se desligado)"""
+    if _active is not None and _active.pid == os.getpid():
+        return _active
+    return None
+
+
+def stage(name: str, city: str | None = None):
+    """Contexto de uma etapa no Profiler ativo (nada é medido se não houver um)"""
+    if _active is None:
+        return _NULL
+    return _active.stage(name, city)
+
+
+@contextlib.contextmanager
+def activate(profiler: Profiler | None):
+    """Torna o profiler o ativo dentro do bloco (None desliga)"""
+    global _active
+    prev, _active = _active, profiler
+    try:
+        yield profiler
+    finally:
+        _active = prev
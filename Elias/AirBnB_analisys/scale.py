@@ -0,0 +1,69 @@
+import json
+import os
+
+import numpy as np
+
+#-----------------------------------------------------------------
+# ---------------ESCALA DE MARCADORES POR QUANTIL------------------
+#-----------------------------------------------------------------
+# Em vez de esticar min..max (um anúncio de $10.000 achata todo o resto),
+# o custo é dividido em SCALE_BINS faixas de mesmo número de anúncios.
+# As bordas são calculadas uma vez por cidade e gravadas junto do cache;
+# cada trace só faz um searchsorted para achar a faixa de cada anúncio.
+
+SCALE_BINS = 20
+SIZE_MIN, SIZE_MAX = 6, 26
+SCALE_FILE = 'scale.json'
+
+
+def compute_scale(custo, bins: int = SCALE_BINS) -> dict:
+    """Bordas dos quantis do custo (faixas repetidas em dados com empate são fundidas)"""
+    c = np.asarray(custo, dtype=np.float64)
+    c = c[np.isfinite(c)]
+    if len(c) == 0:
+        edges = np.array([0.0, 1.0])
+    else:
+        edges = np.unique(np.quantile(c, np.linspace(0, 1, bins + 1)))
+        if len(edges) == 1:
+            edges = np.array([edges[0], edges[0]])
+    return dict(edges = [float(e) for e in edges])
+
+
+def bin_index(scale: dict, custo) -> np.ndarray:
+    """Faixa (0 .. n_bins-1) de cada custo: um único searchsorted"""
+    inner = np.asarray(scale['edges'][1:-1])
+    return np.searchsorted(inner, np.asarray(custo), side='right').astype(np.int32)
+
+
+def n_bins(scale: dict) -> int:
+    return max(len(scale['edges']) - 1, 1)
+
+
+def sizes_for(scale: dict, bins: np.ndarray) -> np.ndarray:
+    """Tamanho do marcador por faixa, de SIZE_MIN a SIZE_MAX"""
+    nb = n_bins(scale)
+    if nb == 1:
+        return np.full(len(bins), 10.0, dtype=np.float32)
+    table = np.linspace(SIZE_MIN, SIZE_MAX, nb).astype(np.float32)
+    return table[bins]
+
+
+def colorbar_for(scale: dict, ticks: int = 5) -> dict:
+    """Colorbar em faixas com o custo real da borda de cada uma no rótulo"""
+    nb = n_bins(scale)
+    tickvals = np.unique(np.linspace(0, nb - 1, min(ticks, nb)).round().astype(int))
+    ticktext = [f"{scale['edges'][i]:,.0f}" for i in tickvals]
+    return dict(title='custo', tickvals=tickvals.tolist(), ticktext=ticktext)
+
+
+def save(folder: str, scale: dict):
+    with open(os.path.join(folder, SCALE_FILE), 'w', encoding='utf-8') as f:
+        json.dump(scale, f)
+
+
+def load(folder: str) -> dict | None:
+    try:
+        with open(os.path.join(folder, SCALE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,102 @@
+import numpy as np
+
+#-----------------------------------------------------------------
+# ---------------SKETCH DE QUANTIS (KLL)---------------------------
+#-----------------------------------------------------------------
+# Guarda uma amostra "comprimida" dos valores em níveis: um item no nível h
+# vale 2^h itens originais. Quando um nível enche, ele é ordenado e metade
+# dos itens (os de posição par ou ímpar, sorteado) sobe para o nível de cima.
+# Memória: O(k) itens, não importa quantos valores passaram.
+#
+# Erro (Karnin, Lang & Liberty, 2016): o erro de rank normalizado é da ordem
+# de 1/k. Na prática (mesmas constantes do Apache DataSketches) fica em torno
+# de 1.65% com 99% de confiança para k=200, ou seja, a "mediana" devolvida
+# está entre os quantis 0.4835 e 0.5165 dos dados reais.
+
+DEFAULT_K = 200
+_MIN_CAPACITY = 8
+_DECAY = 2 / 3
+
+
+class KLLSketch:
+    """Sketch de quantis que pode ser atualizado por bloco e juntado (merge) entre processos"""
+
+    def __init__(self, k: int = DEFAULT_K, seed: int | None = None):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - 1 - h
+        return max(_MIN_CAPACITY, int(np.ceil(self.k * _DECAY ** depth)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # com quantidade ímpar, um item fica onde está
+                keep = level[:len(level) % 2]
+                rest = level[len(keep):]
+                promoted = rest[self._rng.integers(2)::2]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                self.levels[h] = keep
+            h += 1
+
+    def update(self, values) -> 'KLLSketch':
+        """Acrescenta um bloco de valores (NaN/inf são ignorados)"""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        v = v[np.isfinite(v)]
+        if len(v):
+            self.n += len(v)
+            self.min = min(self.min, float(v.min()))
+            self.max = max(self.max, float(v.max()))
+            self.levels[0] = np.concatenate([self.levels[0], v])
+            self._compress()
+        return self
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Junta outro sketch neste (ex.: resultados de vários workers)"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs) -> np.ndarray:
+        """Quantis aproximados para qs em [0, 1]; 0 e 1 devolvem min/max exatos"""
+        qs = np.atleast_1d(np.asarray(qs, dtype=np.float64))
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items = items[order]
+        cum = np.cumsum(weights[order])
+        pos = np.searchsorted(cum, qs * cum[-1], side='left')
+        out = items[np.clip(pos, 0, len(items) - 1)]
+        out = np.where(qs <= 0, self.min, out)
+        return np.where(qs >= 1, self.max, out)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    def size(self) -> int:
+        """Quantos itens estão guardados de fato (memória usada)"""
+        return int(sum(len(level) for level in self.levels))
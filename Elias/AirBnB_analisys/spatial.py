@@ -0,0 +1,172 @@
+import json
+import os
+
+import numpy as np
+
+import cache
+
+#-----------------------------------------------------------------
+# ---------------ÍNDICE ESPACIAL EM GRADE UNIFORME-----------------
+#-----------------------------------------------------------------
+# Os anúncios são ordenados pela célula da grade (linha = lat, coluna = lon)
+# e `starts[c]:starts[c+1]` dá o trecho da célula c nessa ordem (formato CSR).
+# Numa linha da grade as células vizinhas ficam contíguas, então uma busca
+# por retângulo vira uma fatia por linha + um filtro exato nas bordas.
+
+EARTH_RADIUS_M = 6_371_008.8
+M_PER_DEG = np.pi * EARTH_RADIUS_M / 180
+POINTS_PER_CELL = 16
+MAX_CELLS_PER_AXIS = 4096
+INDEX_VERSION = 1
+
+
+def haversine_m(lat0, lon0, lat, lon) -> np.ndarray:
+    """Distância (metros) de (lat0, lon0) até cada ponto"""
+    p0, p = np.radians(lat0), np.radians(np.asarray(lat, dtype=np.float64))
+    dp = p - p0
+    dl = np.radians(np.asarray(lon, dtype=np.float64) - lon0)
+    a = np.sin(dp / 2) ** 2 + np.cos(p0) * np.cos(p) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """Índice de uma cidade; as consultas devolvem índices das linhas do store"""
+
+    def __init__(self, lat, lon, order, starts, bbox, shape):
+        self.lat = np.asarray(lat)
+        self.lon = np.asarray(lon)
+        self.order = order
+        self.starts = starts
+        self.bbox = tuple(float(v) for v in bbox)
+        self.ny, self.nx = shape
+        self.cell_lat = (self.bbox[2] - self.bbox[0]) / self.ny
+        self.cell_lon = (self.bbox[3] - self.bbox[1]) / self.nx
+        # coordenadas na ordem da grade: leitura sequencial nas consultas
+        self._lat_s = self.lat[order]
+        self._lon_s = self.lon[order]
+
+    @classmethod
+    def build(cls, lat, lon, points_per_cell: int = POINTS_PER_CELL) -> 'GridIndex':
+        lat = np.asarray(lat)
+        lon = np.asarray(lon)
+        n = len(lat)
+        if n:
+            bbox = (float(lat.min()), float(lon.min()), float(lat.max()) + 1e-9, float(lon.max()) + 1e-9)
+        else:
+            bbox = (0.0, 0.0, 1e-9, 1e-9)
+        side = int(np.clip(np.ceil(np.sqrt(max(n, 1) / points_per_cell)), 1, MAX_CELLS_PER_AXIS))
+        iy, ix = cls._cells(lat, lon, bbox, side, side)
+        cell = iy * side + ix
+        order = np.argsort(cell, kind='stable').astype(np.int64)
+        counts = np.bincount(cell, minlength=side * side)
+        starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(lat, lon, order, starts, bbox, (side, side))
+
+    @staticmethod
+    def _cells(lat, lon, bbox, ny, nx):
+        iy = ((np.asarray(lat, dtype=np.float64) - bbox[0]) * (ny / (bbox[2] - bbox[0]))).astype(np.int64)
+        ix = ((np.asarray(lon, dtype=np.float64) - bbox[1]) * (nx / (bbox[3] - bbox[1]))).astype(np.int64)
+        return np.clip(iy, 0, ny - 1), np.clip(ix, 0, nx - 1)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    #---------------------- CONSULTAS ------------------------------
+
+    def _candidates(self, lat_min, lon_min, lat_max, lon_max) -> np.ndarray:
+        # posições (na ordem da grade) das células que tocam o retângulo
+        if lat_max < self.bbox[0] or lat_min > self.bbox[2] or lon_max < self.bbox[1] or lon_min > self.bbox[3]:
+            return np.empty(0, np.int64)
+        (y0, y1), (x0, x1) = self._cells([lat_min, lat_max], [lon_min, lon_max], self.bbox, self.ny, self.nx)
+        rows = np.arange(y0, y1 + 1) * self.nx
+        lo = self.starts[rows + x0]
+        hi = self.starts[rows + x1 + 1]
+        if len(rows) == 1:
+            return np.arange(lo[0], hi[0])
+        # concatena as fatias de cada linha sem laço em python
+        lens = hi - lo
+        total = int(lens.sum())
+        if total == 0:
+            return np.empty(0, np.int64)
+        offs = np.repeat(lo - np.concatenate([[0], np.cumsum(lens)[:-1]]), lens)
+        return np.arange(total) + offs
+
+    def bbox_query(self, lat_min, lon_min, lat_max, lon_max) -> np.ndarray:
+        """Índices dos anúncios dentro do retângulo (limites inclusivos)"""
+        pos = self._candidates(lat_min, lon_min, lat_max, lon_max)
+        la, lo = self._lat_s[pos], self._lon_s[pos]
+        keep = (la >= lat_min) & (la <= lat_max) & (lo >= lon_min) & (lo <= lon_max)
+        return self.order[pos[keep]]
+
+    def radius_query(self, lat, lon, meters: float, return_distance: bool = False):
+        """Índices dos anúncios a até `meters` metros de (lat, lon)"""
+        dlat = meters / M_PER_DEG
+        dlon = meters / (M_PER_DEG * max(np.cos(np.radians(lat)), 1e-6))
+        pos = self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        d = haversine_m(lat, lon, self._lat_s[pos], self._lon_s[pos])
+        keep = d <= meters
+        idx = self.order[pos[keep]]
+        return (idx, d[keep]) if return_distance else idx
+
+    def knn_query(self, lat, lon, k: int = 10, return_distance: bool = False):
+        """
+        Os k anúncios mais próximos de (lat, lon), do mais perto para o mais longe.
+        O raio de busca começa no tamanho de ~k células e dobra até achar k pontos.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            empty = np.empty(0, np.int64)
+            return (empty, np.empty(0)) if return_distance else empty
+        cell_m = max(self.cell_lat, self.cell_lon) * M_PER_DEG
+        r = cell_m * max(np.sqrt(k / POINTS_PER_CELL), 1.0)
+        # raio que cobre a cidade inteira a partir do ponto: garante o fim do laço
+        far = float(np.max(haversine_m(lat, lon,
+                                       [self.bbox[0], self.bbox[0], self.bbox[2], self.bbox[2]],
+                                       [self.bbox[1], self.bbox[3], self.bbox[1], self.bbox[3]])))
+        while True:
+            idx, d = self.radius_query(lat, lon, r, return_distance=True)
+            if len(idx) >= k or r > far:
+                break
+            r *= 2
+        top = np.argsort(d, kind='stable')[:k]
+        return (idx[top], d[top]) if return_distance else idx[top]
+
+    #---------------------- PERSISTÊNCIA ---------------------------
+
+    def save(self, folder: str, source: dict | None = None):
+        np.save(os.path.join(folder, 'grid_order.npy'), self.order)
+        np.save(os.path.join(folder, 'grid_starts.npy'), self.starts)
+        meta = dict(version=INDEX_VERSION, bbox=self.bbox, shape=[self.ny, self.nx],
+                    rows=len(self), source=source)
+        with open(os.path.join(folder, 'grid_meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, folder: str, lat, lon, source: dict | None = None) -> 'GridIndex | None':
+        """Índice salvo em folder, ou None se não existir ou for de outra versão dos dados"""
+        try:
+            with open(os.path.join(folder, 'grid_meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != INDEX_VERSION or meta['rows'] != len(lat) or meta.get('source') != source:
+            return None
+        order = np.load(os.path.join(folder, 'grid_order.npy'), mmap_mode='r')
+        starts = np.load(os.path.join(folder, 'grid_starts.npy'))
+        return cls(lat, lon, np.asarray(order), starts, meta['bbox'], meta['shape'])
+
+
+def open_index(city_store) -> GridIndex:
+    """
+    Índice de um store.CityStore, salvo na mesma pasta. É refeito quando
+    o cache da cidade foi regravado (outra versão do cache, outra geração
+    da entrada ou hash da origem diferente)
+    """
+    meta = cache.read_meta(city_store.folder) or {}
+    source = dict(version=meta.get('version'), generation=meta.get('generation'),
+                  hash=(meta.get('source') or {}).get('hash'))
+    index = GridIndex.load(city_store.folder, city_store.lat, city_store.lon, source)
+    if index is None:
+        index = GridIndex.build(city_store.lat, city_store.lon)
+        index.save(city_store.folder, source)
+    return index
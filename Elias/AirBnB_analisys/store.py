@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+
+import cache
+import scale
+
+
+class NameBuffer:
+    """
+    Nomes de uma cidade como um buffer utf-8 (o nome.npy do cache, separado
+    por NUL) mais um vetor de offsets: o nome i ocupa
+    buf[offsets[i]:offsets[i + 1] - 1]. Nada vira objeto
+    Python até alguém pedir: names[idx] decodifica só as linhas pedidas
+    (ex.: os 20 mil pontos do lod de uma cidade com milhões de anúncios).
+    """
+
+    def __init__(self, buf: np.ndarray):
+        self.buf = buf
+        # cada separador fecha um nome; o último fecha no fim do buffer
+        sep = np.flatnonzero(buf == 0)
+        self.offsets = np.concatenate([[0], sep + 1, [len(buf) + 1]]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _decode(self, i) -> str:
+        return self.buf[self.offsets[i]:self.offsets[i + 1] - 1].tobytes().decode('utf-8')
+
+    def __getitem__(self, idx):
+        if np.isscalar(idx):
+            return self._decode(range(len(self))[idx])
+        # slices, máscaras e índices negativos viram posições absolutas
+        if isinstance(idx, slice):
+            idx = np.arange(*idx.indices(len(self)))
+        idx = np.asarray(idx)
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        idx = np.where(idx < 0, idx + len(self), idx)
+        out = np.empty(len(idx), dtype=object)
+        for k, i in enumerate(idx):
+            out[k] = self._decode(i)
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        # tudo de uma vez: um decode e um split só
+        names = self.buf.tobytes().decode('utf-8').split('\0') if len(self.buf) else ['']
+        return np.array(names, dtype=object if dtype is None else dtype)
+
+
+class CityStore:
+    """
+    Dados normalizados de uma cidade em arquivos .npy (mesmo layout do cache).
+    lat, lon e custo são float32 contíguos abertos com np.load(mmap_mode='r'):
+    nada é copiado para a memória do processo e vários processos (servidor web,
+    job em lote) compartilham a mesma cópia no page cache do sistema.
+    O nome fica à parte num NameBuffer e só é decodificado quando alguém pede.
+    """
+
+    numeric = ('lat', 'lon', 'custo')
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        for col in self.numeric:
+            arr = np.load(os.path.join(folder, f"{col}.npy"), mmap_mode='r')
+            if arr.dtype != np.float32 or arr.ndim != 1:
+                raise ValueError(f'{col}.npy em {folder} não é um vetor float32')
+            setattr(self, col, arr)
+        self._nome = None
+        self._scale = None
+        self._meta = None
+
+    @property
+    def nome(self) -> NameBuffer | np.ndarray:
+        if self._nome is None:
+            if len(self):
+                self._nome = NameBuffer(np.load(os.path.join(self.folder, 'nome.npy'), mmap_mode='r'))
+            else:
+                self._nome = np.empty(0, dtype=object)
+        return self._nome
+
+    @property
+    def meta(self) -> dict:
+        """meta.json da entrada do cache (origem, linhas, contagens da validação)"""
+        if self._meta is None:
+            self._meta = cache.read_meta(self.folder) or {}
+        return self._meta
+
+    @property
+    def scale(self) -> dict:
+        """Faixas de quantil do custo gravadas junto do cache (calcula se faltar)"""
+        if self._scale is None:
+            self._scale = scale.load(self.folder)
+            if self._scale is None:
+                self._scale = scale.compute_scale(self.custo)
+        return self._scale
+
+    def __getitem__(self, col: str) -> np.ndarray:
+        # mesma interface de coluna do DataFrame: store['lat'], store['nome']...
+        if col not in self.numeric and col != 'nome':
+            raise KeyError(col)
+        return getattr(self, col)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def to_frame(self):
+        """Cópia em DataFrame (para quem precisa de pandas)"""
+        import pandas as pd
+        return pd.DataFrame({col: np.array(self[col]) for col in (*self.numeric, 'nome')})
+
+
+def open_city(path, loader, cache_dir=None, refresh: bool = False) -> CityStore:
+    """
+    Abre o store de um CSV; se o cache estiver vencido (ou refresh=True)
+    roda loader(path) e regrava os arquivos antes de mapear.
+    """
+    folder = cache.entry_dir(path, cache_dir)
+    if refresh or not cache.check_entry(path, folder):
+        cache.save(path, loader(path), cache_dir)
+    return CityStore(folder)
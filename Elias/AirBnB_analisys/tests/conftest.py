@@ -0,0 +1,5 @@
+import os
+import sys
+
+# os módulos do projeto são importados lado a lado (import main, import csvsplit)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
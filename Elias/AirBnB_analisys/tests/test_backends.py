@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import csvsplit
+import main
+
+CENTER = [40.73, -73.95]
+NA_TOKENS = ['', 'NA', 'N/A', 'null', 'NaN', '#N/A', 'None']
+
+
+def messy_rows(n: int = 400, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        lat = f'{40.73 + rng.normal(0, 0.05):.6f}'
+        lon = f'{-73.95 + rng.normal(0, 0.05):.6f}'
+        kind = i % 9
+        if kind == 0:
+            price = f'"${rng.integers(1, 5)},{rng.integers(100, 999)}.00"'
+        elif kind == 1:
+            price = NA_TOKENS[i % len(NA_TOKENS)]
+        elif kind == 2:
+            price = f'({rng.integers(5, 50)}.00)'
+        elif kind == 3:
+            lat = NA_TOKENS[i % len(NA_TOKENS)]
+            price = '$80.00'
+        elif kind == 4:
+            lat, lon, price = '0', '0', '$10.00'
+        elif kind == 5:
+            lat, price = 'sem', '$70.00'
+        else:
+            price = f'${rng.integers(20, 900)}.{rng.integers(0, 99):02d}'
+        name = f'"Apt {i}\nsegunda linha, ""aspas"""' if i % 7 == 0 else f'Apt {i}'
+        rows.append((i, name, lat, lon, price))
+    return rows
+
+
+def write(path, rows: list, with_name: bool = True, short_row: bool = True):
+    header = 'id,name,latitude,longitude,price,extra' if with_name else 'id,latitude,longitude,price,extra'
+    lines = [header]
+    for i, name, lat, lon, price in rows:
+        fields = [str(i), name, lat, lon, price, 'x'] if with_name else [str(i), lat, lon, price, 'x']
+        lines.append(','.join(fields))
+    if short_row:
+        # linha curta no meio (sem price/extra) e outra truncada no fim
+        mid = len(lines) // 2
+        lines.insert(mid, '9999,Curta,40.74,-73.96' if with_name else '9999,40.74,-73.96')
+        lines.append('10000')
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+def assert_same(got: pd.DataFrame, ref: pd.DataFrame):
+    assert list(got.columns) == list(ref.columns)
+    assert len(got) == len(ref)
+    for col in ('lat', 'lon', 'custo'):
+        np.testing.assert_array_equal(got[col].to_numpy(np.float32), ref[col].to_numpy(np.float32), err_msg=col)
+    np.testing.assert_array_equal(got['nome'].astype(str).to_numpy(), ref['nome'].astype(str).to_numpy())
+    assert got.attrs['coord_checks'] == ref.attrs['coord_checks']
+
+
+@pytest.fixture(params=['nome', 'sem_nome', 'sem_linha_curta'])
+def messy_csv(request, tmp_path):
+    path = tmp_path / 'messy.csv'
+    write(path, messy_rows(), with_name=request.param != 'sem_nome',
+          short_row=request.param != 'sem_linha_curta')
+    return path
+
+
+@pytest.mark.parametrize('backend', [b for b in main.BACKENDS if b != 'pandas'])
+def test_backend_matches_pandas(messy_csv, backend, monkeypatch):
+    if backend in ('arrow', 'polars'):
+        pytest.importorskip('pyarrow' if backend == 'arrow' else 'polars')
+    # faixas pequenas: o 'parallel' junta várias faixas
+    monkeypatch.setattr(csvsplit, 'RANGE_BYTES', 2 << 10)
+    monkeypatch.setattr(csvsplit, 'MIN_RANGE_BYTES', 1 << 10)
+    ref = main.load_city(messy_csv, chunksize=None, center=CENTER)
+    got = main.load_city(messy_csv, backend=backend, center=CENTER)
+    assert_same(got, ref)
+
+
+def test_streaming_matches_whole_file(messy_csv):
+    ref = main.load_city(messy_csv, chunksize=None, center=CENTER)
+    got = main.load_city(messy_csv, chunksize=50, center=CENTER)
+    assert len(got) == len(ref)
+    # o streaming lê as coordenadas direto em float32 (arredondamento de 1 ulp)
+    for col in ('lat', 'lon'):
+        np.testing.assert_allclose(got[col].to_numpy(), ref[col].to_numpy(), rtol=1e-6, err_msg=col)
+    np.testing.assert_array_equal(got['nome'].astype(str).to_numpy(), ref['nome'].astype(str).to_numpy())
+    assert got.attrs['coord_checks'] == ref.attrs['coord_checks']
+    # a mediana do streaming vem do sketch: só os custos preenchidos podem diferir
+    got_c, ref_c = got['custo'].to_numpy(np.float32), ref['custo'].to_numpy(np.float32)
+    diff = got_c != ref_c
+    assert len(set(got_c[diff])) <= 1 and len(set(ref_c[diff])) <= 1
+
+
+def test_messy_file_keeps_short_row_and_parses_prices(tmp_path):
+    path = tmp_path / 'messy.csv'
+    write(path, messy_rows())
+    df = main.load_city(path, chunksize=None, center=CENTER)
+    assert 'Curta' in set(df['nome'])
+    assert (df['custo'] < 0).any()           # "(12.00)" é negativo
+    assert df['custo'].max() >= 1_000        # "$1,234.00"
+    assert df.attrs['coord_checks']['zero_zero'] > 0
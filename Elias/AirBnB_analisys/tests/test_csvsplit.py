@@ -0,0 +1,82 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import csvsplit
+
+
+def write_csv(path, newline: str, rows: int = 300, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    lines = ['id,name,lat']
+    for i in range(rows):
+        kind = i % 5
+        if kind == 1:
+            # quebra de linha dentro de aspas (com o mesmo fim de linha do arquivo)
+            name = f'"linha 1{newline}linha 2 {i}"'
+        elif kind == 2:
+            # aspas escapadas e vírgula dentro do campo
+            name = f'"diz ""oi"", {i}"'
+        elif kind == 3:
+            name = f'"{newline}"'
+        else:
+            name = f'nome {i}'
+        lines.append(f'{i},{name},{rng.random():.6f}')
+        if i % 37 == 0:
+            lines.append('')   # linha em branco: o pandas pula
+    data = (newline.join(lines) + newline).encode('utf-8')
+    path.write_bytes(data)
+    return data
+
+
+def read_ranges(path, data: bytes, ranges: list) -> list:
+    frames = []
+    for start, end, first_row in ranges:
+        df = pd.read_csv(io.BytesIO(data[start:end]), header=None, names=['id', 'name', 'lat'])
+        frames.append((first_row, df))
+    return frames
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+@pytest.mark.parametrize('parts', [1, 2, 7, 40])
+@pytest.mark.parametrize('block', [64, 4096, csvsplit.BLOCK_BYTES])
+def test_ranges_match_whole_file(tmp_path, monkeypatch, newline, parts, block):
+    path = tmp_path / 'dados.csv'
+    data = write_csv(path, newline)
+    # blocos pequenos: a paridade das aspas precisa atravessar os blocos
+    ends = csvsplit.record_ends
+    monkeypatch.setattr(csvsplit, 'record_ends', lambda mm, block_=block: ends(mm, block_))
+
+    ranges = csvsplit.split_ranges(path, parts=parts)
+    assert ranges[0][0] == data.index(newline.encode()) + len(newline)
+    assert ranges[-1][1] == len(data)
+    # faixas contíguas, cada uma terminando num fim de registro
+    for (_, end, _), (start, _, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[end - 1:end] == b'\n'
+
+    whole = pd.read_csv(path)
+    frames = read_ranges(path, data, ranges)
+    got = pd.concat([df for _, df in frames], ignore_index=True)
+    pd.testing.assert_frame_equal(got, whole)
+    # registros antes de cada faixa = posição da primeira linha dela no arquivo
+    rows = 0
+    for first_row, df in frames:
+        assert first_row == rows
+        rows += len(df)
+
+
+def test_record_ends_skips_quoted_newlines_and_blank_lines():
+    data = b'a,b\r\n1,"x\r\ny"\r\n\r\n2,"""q""\n"\n'
+    mm = np.frombuffer(data, np.uint8)
+    ends = np.concatenate(list(csvsplit.record_ends(mm, block=4)))
+    assert [data[:e + 1].count(b'\n') for e in ends] == [1, 3, 6]
+
+
+def test_empty_and_header_only(tmp_path):
+    empty = tmp_path / 'vazio.csv'
+    empty.write_bytes(b'')
+    assert csvsplit.split_ranges(empty) == []
+    header = tmp_path / 'cabecalho.csv'
+    header.write_bytes(b'a,b\r\n')
+    assert csvsplit.split_ranges(header) == []
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('$1,234.00', 1234.0),
+    ('R$ 350,00', 350.0),
+    ('1.234,5', 1234.5),
+    ('1.234.567', 1234567.0),
+    ('-5', -5.0),
+    ('$-5', -5.0),
+    ('-$1,234.50', -1234.5),
+    ('(5.00)', -5.0),
+    ('($1,234.00)', -1234.0),
+    ('1e-05', 1e-05),
+])
+def test_parse_currency_values(text, expected):
+    assert main.parse_currency([text]).iloc[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('text', ['3-4', '5-', '--5', '(5', '5)', '((5))', '-(5)', 'abc', ''])
+def test_parse_currency_invalid_is_nan(text):
+    assert np.isnan(main.parse_currency([text]).iloc[0])
+
+
+def test_parse_currency_numeric_column_passes_through():
+    out = main.parse_currency(pd.Series([1.5, np.nan, 3]))
+    assert out.tolist()[0] == 1.5 and np.isnan(out.iloc[1]) and out.iloc[2] == 3
+
+
+def test_ambiguous_values_follow_column_vote():
+    # "1,234" sozinho é milhar; numa coluna com vírgula decimal é 1.234
+    assert main.parse_currency(['1,234']).iloc[0] == 1234
+    assert main.parse_currency(['1,234', '2,50']).iloc[0] == pytest.approx(1.234)
+    assert main.parse_currency(['1,234'], decimal=',').iloc[0] == pytest.approx(1.234)
+
+
+def test_decimal_decided_once_per_file(tmp_path):
+    # só o início do arquivo tem valores sem ambiguidade ("2,50"): os blocos
+    # seguintes, só com "1,234", têm que usar o mesmo decimal
+    path = tmp_path / 'precos.csv'
+    rows = ['lat,lon,price'] + ['-22.9,-43.2,"2,50"'] * 10 + ['-22.9,-43.2,"1,234"'] * 30
+    path.write_text('\n'.join(rows) + '\n', encoding='utf-8')
+    assert main.sniff_columns(path)['decimal'] == ','
+    # centro do Rio: sem ele os eixos não são verificáveis e o load_city avisa
+    rio = (-22.9, -43.2)
+    for df in (main.load_city(path, chunksize=None, center=rio), main.load_city(path, chunksize=10, center=rio),
+               main.load_city(path, backend='parallel', center=rio)):
+        assert df['custo'].to_numpy()[-1] == pytest.approx(1.234)
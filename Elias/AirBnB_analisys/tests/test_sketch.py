@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import sketch
+
+QS = np.linspace(0.05, 0.95, 19)
+# erro de rank normalizado do KLL com k=200: ~1.65% com 99% de confiança
+MAX_RANK_ERROR = 0.0165
+
+
+def rank_error(data: np.ndarray, sk: sketch.KLLSketch) -> float:
+    data = np.sort(data)
+    ranks = np.searchsorted(data, sk.quantiles(QS), side='right') / len(data)
+    return float(np.max(np.abs(ranks - QS)))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rank_error_within_bound(seed):
+    data = np.random.default_rng(seed).lognormal(5, 1, 200_000)
+    sk = sketch.KLLSketch(seed=seed)
+    for block in np.array_split(data, 20):
+        sk.update(block)
+    assert len(sk) == len(data)
+    assert sk.size() < 2_000
+    assert rank_error(data, sk) <= MAX_RANK_ERROR
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_merged_sketches_within_bound(seed):
+    rng = np.random.default_rng(seed)
+    # partes de tamanhos e distribuições diferentes, como as faixas de um CSV
+    parts = [rng.lognormal(4 + i % 3, 1, rng.integers(1_000, 60_000)) for i in range(8)]
+    merged = sketch.KLLSketch(seed=seed)
+    for i, part in enumerate(parts):
+        merged.merge(sketch.KLLSketch(seed=seed * 100 + i).update(part))
+    data = np.concatenate(parts)
+    assert len(merged) == len(data)
+    assert merged.min == data.min() and merged.max == data.max()
+    assert rank_error(data, merged) <= MAX_RANK_ERROR
+
+
+def test_small_input_is_exact_and_nan_ignored():
+    sk = sketch.KLLSketch().update([3.0, np.nan, 1.0, 2.0, np.inf])
+    assert len(sk) == 3
+    assert sk.median() == 2.0
+    assert np.isnan(sketch.KLLSketch().median())
+
+
+
+def test_merge_matches_single_sketch_counts():
+    a = sketch.KLLSketch(seed=1).update(np.arange(1_000, dtype=float))
+    b = sketch.KLLSketch(seed=2).update(np.arange(1_000, 3_000, dtype=float))
+    empty = sketch.KLLSketch()
+    merged = sketch.KLLSketch(seed=3).merge(a).merge(empty).merge(b)
+    assert len(merged) == 3_000
+    assert merged.min == 0 and merged.max == 2_999
+    # itens guardados ponderados por 2^nível somam os valores vistos
+    weight = sum(len(level) * 2 ** h for h, level in enumerate(merged.levels))
+    assert weight == pytest.approx(3_000, rel=0.05)
+    assert abs(merged.median() - 1_500) <= MAX_RANK_ERROR * 3_000
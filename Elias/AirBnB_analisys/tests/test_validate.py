@@ -0,0 +1,147 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import csvsplit
+import main
+import validate
+
+RIO = (-22.91, -43.2)
+NY = (40.73, -73.95)
+
+
+def city(center, n: int = 500, seed: int = 0, spread: float = 0.05) -> tuple:
+    rng = np.random.default_rng(seed)
+    return (center[0] + rng.normal(0, spread, n), center[1] + rng.normal(0, spread, n))
+
+
+# ---------------REGRAS---------------
+
+def test_rules_count_each_dropped_row_once():
+    lat, lon = city(NY, n=100)
+    lat[:3] = lon[:3] = 0                    # zero_zero
+    lat[3], lon[4] = 95, 200                 # fora_do_intervalo
+    lat[5], lon[6] = np.nan, np.inf          # fora_do_intervalo (não finitos)
+    lat[7], lon[7] = 48.86, 2.35             # outlier: Paris num arquivo de Nova York
+    keep, swapped, counts = validate.check_coordinates(lat, lon)
+    assert not swapped
+    assert counts['zero_zero'] == 3
+    assert counts['fora_do_intervalo'] == 4
+    assert counts['outlier'] == 1
+    assert counts['entrada'] == 100 and counts['saida'] == 92 == keep.sum()
+    assert not keep[:8].any() and keep[8:].all()
+
+
+def test_outlier_limit_never_below_min_km():
+    # cidade compacta (~1 km): um ponto a 30 km continua dentro
+    lat, lon = city(NY, n=200, spread=0.005)
+    lat[0] = NY[0] + 30 / validate.KM_PER_DEG
+    keep, _, counts = validate.check_coordinates(lat, lon)
+    assert counts['outlier'] == 0 and keep[0]
+    lat[0] = NY[0] + 2 * validate.OUTLIER_MIN_KM / validate.KM_PER_DEG
+    keep, _, counts = validate.check_coordinates(lat, lon)
+    assert counts['outlier'] == 1 and not keep[0]
+
+
+def test_clean_frame_records_counts():
+    lat, lon = city(RIO, n=50)
+    lat[0] = lon[0] = 0
+    df = pd.DataFrame({'lat': lat, 'lon': lon, 'custo': 1.0, 'nome': 'x'})
+    out = validate.clean_frame(df, center=RIO)
+    assert len(out) == 49
+    assert out.attrs['coord_checks']['zero_zero'] == 1
+    assert validate.describe(out.attrs['coord_checks']) == 'zero_zero: 1'
+
+
+# ---------------EIXOS TROCADOS---------------
+
+def test_swapped_rio_needs_center():
+    lat, lon = city(RIO)
+    # as duas medianas caberiam como latitude: sem centro não dá para decidir
+    assert validate.axes_swapped(lon, lat) is None
+    assert validate.axes_swapped(lon, lat, center=RIO) is True
+    assert validate.axes_swapped(lat, lon, center=RIO) is False
+
+
+def test_swapped_ny_detected_without_center():
+    lat, lon = city(NY)
+    assert validate.axes_swapped(lon, lat) is True
+    assert validate.axes_swapped(lat, lon) is False
+    assert validate.axes_swapped(lon, lat, center=NY) is True
+
+
+def test_swapped_ignores_zero_zero_and_empty():
+    lat, lon = city(NY, n=10)
+    lat = np.r_[lat, np.zeros(30)]
+    lon = np.r_[lon, np.zeros(30)]
+    assert validate.axes_swapped(lon, lat) is True
+    assert validate.axes_swapped(np.zeros(3), np.zeros(3)) is False
+    assert validate.axes_swapped(np.empty(0), np.empty(0)) is False
+
+
+def test_swapped_columns_are_restored():
+    lat, lon = city(RIO, n=20)
+    df = pd.DataFrame({'lat': lon, 'lon': lat, 'custo': 1.0, 'nome': 'x'})
+    out = validate.clean_frame(df, center=RIO)
+    np.testing.assert_array_equal(out['lat'], lat)
+    np.testing.assert_array_equal(out['lon'], lon)
+    checks = out.attrs['coord_checks']
+    assert checks['eixos_trocados'] and checks['eixos_verificados']
+    assert validate.describe(checks).startswith('lat/lon trocados')
+
+
+def test_load_city_swapped_rio_file(tmp_path):
+    lat, lon = city(RIO, n=60)
+    path = tmp_path / 'rio_trocado.csv'
+    # o arquivo grava a longitude na coluna latitude e vice-versa
+    pd.DataFrame({'name': [f'Apt {i}' for i in range(60)], 'latitude': lon, 'longitude': lat,
+                  'price': '$100.00'}).to_csv(path, index=False)
+    with pytest.warns(UserWarning, match='centro da cidade'):
+        blind = main.load_city(path, chunksize=None)
+    assert not blind.attrs['coord_checks']['eixos_verificados']
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        df = main.load_city(path, chunksize=None, center=RIO)
+    assert df.attrs['coord_checks']['eixos_trocados']
+    assert df['lat'].median() == pytest.approx(RIO[0], abs=0.05)
+
+
+# ---------------CONTAGENS POR BLOCO---------------
+
+def test_add_counts_sums_chunks():
+    lat, lon = city(NY, n=300)
+    lat[::7] = lon[::7] = 0
+    lat[1::11] = 120
+    lat[2::13], lon[2::13] = 10, 10
+    plan = validate.plan_coordinates(lat, lon)
+    whole_keep, whole = validate.apply_plan(lat, lon, plan)
+    total, keeps = None, []
+    for s in range(0, 300, 64):
+        keep, counts = validate.apply_plan(lat[s:s + 64], lon[s:s + 64], plan)
+        total = validate.add_counts(total, counts)
+        keeps.append(keep)
+    assert total == whole
+    np.testing.assert_array_equal(np.concatenate(keeps), whole_keep)
+    # os campos do plano (bool/lista) não são somados
+    assert total['eixos_trocados'] is False and total['centro_esperado'] is None
+
+
+def test_chunked_load_counts_match_whole_file(tmp_path, monkeypatch):
+    # faixas pequenas: o 'parallel' soma as contagens de várias faixas
+    monkeypatch.setattr(csvsplit, 'RANGE_BYTES', 4 << 10)
+    monkeypatch.setattr(csvsplit, 'MIN_RANGE_BYTES', 2 << 10)
+    lat, lon = city(NY, n=400)
+    lat[::9] = lon[::9] = 0
+    lat[1::17] = 99
+    lat[2::23], lon[2::23] = 48.86, 2.35
+    path = tmp_path / 'ny.csv'
+    pd.DataFrame({'name': [f'Apt {i}' for i in range(400)], 'latitude': lat, 'longitude': lon,
+                  'price': '$80.00'}).to_csv(path, index=False)
+    whole = main.load_city(path, chunksize=None)
+    checks = whole.attrs['coord_checks']
+    assert checks['zero_zero'] and checks['fora_do_intervalo'] and checks['outlier']
+    for df in (main.load_city(path, chunksize=37), main.load_city(path, backend='parallel')):
+        assert df.attrs['coord_checks'] == whole.attrs['coord_checks']
+        assert len(df) == len(whole)
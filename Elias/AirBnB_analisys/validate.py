@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+#-----------------------------------------------------------------
+# ---------------VALIDAÇÃO DAS COORDENADAS-------------------------
+#-----------------------------------------------------------------
+# O normalize_frame só descarta lat/lon ausentes. Aqui, só com operações
+# vetorizadas, saem também:
+#   - zero_zero: o (0, 0) que alguns exports usam no lugar de "sem endereço"
+#   - fora_do_intervalo: |lat| > 90 ou |lon| > 180 (e inf)
+#   - outlier: longe demais do centro robusto (mediana) da cidade
+# e o arquivo inteiro tem lat/lon destrocados quando a heurística de eixos
+# trocados (axes_swapped) indicar. Cada linha descartada conta só na
+# primeira regra que a pegou.
+# As decisões que valem para o arquivo inteiro (eixos, centro robusto e
+# limite de outlier) ficam num plano (plan_coordinates), tirado do arquivo
+# todo ou de uma amostra; apply_plan aplica o plano bloco a bloco, então
+# quem lê em partes valida cada parte antes da mediana do custo.
+#
+# Eixos trocados: com o centro da cidade no cadastro (cities.json, "center")
+# vale a orientação cuja mediana fica mais perto dele. Sem centro, só dá
+# para decidir quando uma das medianas não cabe como latitude (|x| > 72,
+# ex.: Nova York, lon -73.9); Rio, Londres, Paris ou Cidade do Cabo têm as
+# duas abaixo disso e ficam sem verificação (eixos_verificados=False).
+
+# nenhuma cidade com anúncios fica acima disso (Tromsø ~69.6, Ushuaia ~-54.8)
+MAX_CITY_LAT = 72.0
+# outlier: distância ao centro maior que OUTLIER_K x a distância mediana
+# (o "raio" típico da cidade), e nunca menor que OUTLIER_MIN_KM
+OUTLIER_K = 10.0
+OUTLIER_MIN_KM = 50.0
+KM_PER_DEG = 111.32
+
+
+def _distance_km(lat, lon, c_lat, c_lon):
+    # distância equiretangular em km (boa na escala de uma cidade);
+    # a diferença de longitude dá a volta em ±180
+    dx = ((lon - c_lon + 180) % 360 - 180) * np.cos(np.radians(c_lat))
+    return np.hypot(dx, lat - c_lat) * KM_PER_DEG
+
+
+def axes_swapped(lat, lon, center=None) -> bool | None:
+    """
+    Heurística por arquivo, sobre as medianas (ignora (0, 0) e não finitos).
+    center: (lat, lon) esperado da cidade; a orientação mais perto dele vence.
+    Sem center: trocado se a |lat| mediana passa de MAX_CITY_LAT (nenhuma
+    cidade fica lá) e a |lon| mediana caberia como latitude. None = não dá
+    para decidir (as duas medianas caberiam como latitude, ou nenhuma)
+    """
+    ok = np.isfinite(lat) & np.isfinite(lon) & ~((lat == 0) & (lon == 0))
+    if not ok.any():
+        return False
+    m_lat, m_lon = float(np.median(lat[ok])), float(np.median(lon[ok]))
+    if center is not None:
+        c_lat, c_lon = center
+        return bool(_distance_km(m_lon, m_lat, c_lat, c_lon) < _distance_km(m_lat, m_lon, c_lat, c_lon))
+    lat_fits, lon_fits = abs(m_lat) <= MAX_CITY_LAT, abs(m_lon) <= MAX_CITY_LAT
+    if lat_fits == lon_fits:
+        return None
+    return lon_fits
+
+
+def plan_coordinates(lat, lon, center=None) -> dict:
+    """
+    Decisões por arquivo a partir de lat/lon (o arquivo todo ou uma amostra):
+    eixos trocados, centro robusto (mediana) e limite de outlier em km.
+    center: (lat, lon) esperado da cidade, do cadastro (ver axes_swapped)
+    """
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    swapped = axes_swapped(lat, lon, center)
+    plan = dict(
+        eixos_trocados = bool(swapped),
+        eixos_verificados = swapped is not None,
+        centro_esperado = list(center) if center is not None else None,
+        centro = None,
+        limite_km = None,
+    )
+    if swapped:
+        lat, lon = lon, lat
+    ok = ~((lat == 0) & (lon == 0)) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    if ok.any():
+        la, lo = lat[ok], lon[ok]
+        c_lat, c_lon = float(np.median(la)), float(np.median(lo))
+        d = _distance_km(la, lo, c_lat, c_lon)
+        plan['centro'] = [c_lat, c_lon]
+        plan['limite_km'] = max(OUTLIER_MIN_KM, OUTLIER_K * float(np.median(d)))
+    return plan
+
+
+def apply_plan(lat, lon, plan: dict) -> tuple:
+    """
+    (manter, contagens) de um bloco de lat/lon na orientação do arquivo:
+    máscara das linhas válidas e quantas linhas cada regra descartou
+    """
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    if plan['eixos_trocados']:
+        lat, lon = lon, lat
+
+    zero = (lat == 0) & (lon == 0)
+    # NaN e inf falham as duas comparações e caem aqui
+    in_range = (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    keep = ~zero & in_range
+    counts = dict(
+        entrada = int(len(lat)),
+        eixos_trocados = plan['eixos_trocados'],
+        eixos_verificados = plan['eixos_verificados'],
+        centro_esperado = plan['centro_esperado'],
+        zero_zero = int(zero.sum()),
+        fora_do_intervalo = int((~zero & ~in_range).sum()),
+        outlier = 0,
+    )
+
+    if keep.any() and plan['centro'] is not None:
+        rows = np.flatnonzero(keep)
+        d = _distance_km(lat[rows], lon[rows], *plan['centro'])
+        far = rows[d > plan['limite_km']]
+        keep[far] = False
+        counts['outlier'] = int(len(far))
+    counts['saida'] = int(keep.sum())
+    return keep, counts
+
+
+def add_counts(total: dict | None, counts: dict) -> dict:
+    """Soma as contagens de dois blocos do mesmo arquivo (o plano é o mesmo)"""
+    if total is None:
+        return dict(counts)
+    return {k: total[k] + v if isinstance(v, int) and not isinstance(v, bool) else v
+            for k, v in counts.items()}
+
+
+def check_coordinates(lat, lon, center=None) -> tuple:
+    """
+    (manter, trocado, contagens): máscara das linhas válidas (já com os eixos
+    destrocados se trocado=True) e quantas linhas cada regra descartou.
+    center: (lat, lon) esperado da cidade, do cadastro (ver axes_swapped)
+    """
+    plan = plan_coordinates(lat, lon, center)
+    keep, counts = apply_plan(lat, lon, plan)
+    return keep, plan['eixos_trocados'], counts
+
+
+def clean_frame(df: pd.DataFrame, center=None, plan: dict | None = None) -> pd.DataFrame:
+    """
+    Aplica o plano (plan_coordinates) num DataFrame lat/lon/custo/nome.
+    plan=None tira o plano do próprio df. As contagens ficam em
+    df.attrs['coord_checks'] (o cache grava no meta.json)
+    """
+    if plan is None:
+        plan = plan_coordinates(df['lat'].to_numpy(), df['lon'].to_numpy(), center)
+    keep, counts = apply_plan(df['lat'].to_numpy(), df['lon'].to_numpy(), plan)
+    if plan['eixos_trocados']:
+        df = df.rename(columns={'lat': 'lon', 'lon': 'lat'})[list(df.columns)]
+    if not keep.all():
+        df = df[keep].reset_index(drop=True)
+    df.attrs['coord_checks'] = counts
+    return df
+
+
+def describe(counts: dict | None) -> str:
+    """Resumo de uma linha das regras que descartaram (ou destrocaram) algo"""
+    if not counts:
+        return ''
+    parts = [f"{k}: {counts[k]}" for k in ('zero_zero', 'fora_do_intervalo', 'outlier') if counts.get(k)]
+    if counts.get('eixos_trocados'):
+        parts.insert(0, 'lat/lon trocados no arquivo')
+    return ', '.join(parts)